@@ -1,9 +1,10 @@
 """
 This file deal with the read/write from the text file
 """
+import json
 import os
 from datetime import datetime
-from typing import Dict, IO, List
+from typing import Dict, IO, List, Tuple
 
 import numpy as np
 from numpy import ndarray
@@ -576,6 +577,129 @@ def saveSurface(info: List, fileName: str) -> None:
     np.save(output_path, result_data)
 
 
+def saveTrace(trace: ndarray, fileName: str) -> None:
+    """
+    This function save the record array of energy and charge of positions scanned into the energy result folder
+    """
+    if not os.path.exists("Result"):
+        os.mkdir("Result")
+
+    if not os.path.exists("Result/ResultEnergy"):
+        os.mkdir("Result/ResultEnergy")
+
+    output_path = "Result/ResultEnergy/{}.npy".format(fileName)
+    np.save(output_path, trace)
+
+    showMessage("Record array of positions saved at {}".format(output_path))
+
+
+def createTrace(length: int, dtype: np.dtype, fileName: str) -> np.memmap:
+    """
+    This function create a .npy record array of length in the energy result folder and open it as memmap
+    Positions are written into it by the workers, the file path is in trace.filename
+    """
+    if not os.path.exists("Result"):
+        os.mkdir("Result")
+
+    if not os.path.exists("Result/ResultEnergy"):
+        os.mkdir("Result/ResultEnergy")
+
+    output_path = "Result/ResultEnergy/{}.npy".format(fileName)
+    trace = np.lib.format.open_memmap(output_path, mode="w+", dtype=dtype, shape=(length,))
+
+    # write the header to the file, so worker process can open the file
+    trace.flush()
+
+    showMessage("Record array of positions created at {}".format(output_path))
+
+    return trace
+
+
+def createEnergyMap(shape: Tuple[int, int], fileName: str) -> np.memmap:
+    """
+    This function create a float32 .npy file in the energy result folder and open it as memmap
+    Every value is NaN until the energy of that position is calculated, the file path is in energyMap.filename
+    """
+    if not os.path.exists("Result"):
+        os.mkdir("Result")
+
+    if not os.path.exists("Result/ResultEnergy"):
+        os.mkdir("Result/ResultEnergy")
+
+    output_path = "Result/ResultEnergy/{}.npy".format(fileName)
+    energyMap = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.float32, shape=shape)
+    energyMap[...] = np.nan
+
+    # write to the file, so worker process open the file see the NaN
+    energyMap.flush()
+
+    showMessage("Energy map created at {}".format(output_path))
+
+    return energyMap
+
+
+def appendCheckpoint(record: Dict, path: str) -> None:
+    """
+    This function append one finished iteration to the checkpoint file as one json line, and force it onto the disk
+    so it is kept even if the job is killed right after
+    """
+    # a line not complete is left by a job killed when writing, start a new line after it
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as file:
+            file.seek(-1, os.SEEK_END)
+            newLine = file.read(1) != b"\n"
+    else:
+        newLine = False
+
+    with open(path, "a") as file:
+        if newLine:
+            file.write("\n")
+        file.write(json.dumps(record) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def loadCheckpoint(path: str) -> List[Dict]:
+    """
+    This function read all finished iterations in the checkpoint file, return an empty list if there is no file
+    A line not complete is the iteration interrupted when writing, it is ignored
+    """
+    if not os.path.exists(path):
+        return []
+
+    records = []
+    with open(path) as file:
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+
+    return records
+
+
+def saveCheckpointSurface(surfaces: Dict[str, ndarray], path: str) -> None:
+    """
+    This function save the surfaces of a simulation with checkpoint into one .npz file, the file is written to a
+    temporary name first, so a job killed when writing never leaves a broken file
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as file:
+        np.savez(file, **surfaces)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(temp_path, path)
+
+
+def loadCheckpointSurface(path: str) -> Dict[str, ndarray]:
+    """
+    This function read all surfaces saved by saveCheckpointSurface
+    """
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
 def timeMonitor(func):
     """
     A decorator to monitor time for this function
@@ -124,7 +124,6 @@ def getDynamicArgument() -> [str, int, int]:
     while True:
 
         bacteriaNum = input("Please enter the number of bacteria you want to test or help for more information: ")
-        number = bacteriaNum
 
         # set the name
         helpName = "NUMBER"
@@ -134,13 +133,14 @@ def getDynamicArgument() -> [str, int, int]:
             helpMessage(helpName)
             continue
 
-        # check the validity of input and do reaction
-        result = eval(execDict[helpName])
-
-        if not checkNum(bacteriaNum):
+        # check the validity of input and do reaction, the number is checked as an int
+        if not checkInt(bacteriaNum):
             errorInput(helpName)
-        elif result:
-            bacteriaNum = int(bacteriaNum)
+            continue
+
+        number = int(bacteriaNum)
+        if eval(execDict[helpName]):
+            bacteriaNum = number
             break
         else:
             errorInput(helpName)
@@ -246,12 +246,14 @@ def getEnergyScanArgument() -> [int, int, int, str, int]:
         elif simulationType == 2:
             filmNum = "1"
             bacteriaNum = input("Please enter the number of bacteria you want to test or help for more information: ")
-            number = bacteriaNum
 
         elif simulationType == 3:
             filmNum = input("Please enter the number of bacteria you want to test or help for more information: ")
             bacteriaNum = "1"
-            number = filmNum
+
+        elif simulationType == 4:
+            filmNum = input("Please enter the number of film you want to test or help for more information: ")
+            bacteriaNum = input("Please enter the number of bacteria you want to test or help for more information: ")
         else:
             raise RuntimeError("Wrong simulation type, causes get bacteria/film number error")
 
@@ -263,14 +265,19 @@ def getEnergyScanArgument() -> [int, int, int, str, int]:
             helpMessage(helpName)
             continue
 
-        # check the validity of input and do reaction
-        result = eval(execDict[helpName])
-
-        if not checkNum(bacteriaNum) or not checkNum(filmNum):
+        # check the validity of input and do reaction, numbers are checked as int
+        if not checkInt(bacteriaNum) or not checkInt(filmNum):
             errorInput(helpName)
-        elif result:
-            filmNum = int(filmNum)
-            bacteriaNum = int(bacteriaNum)
+            continue
+
+        # film number and bacteria number need to be positive on their own
+        filmNum = int(filmNum)
+        bacteriaNum = int(bacteriaNum)
+        result = True
+        for number in [filmNum, bacteriaNum]:
+            result = result and eval(execDict[helpName])
+
+        if result:
             break
         else:
             errorInput(helpName)
@@ -844,6 +851,17 @@ def checkNum(input: str) -> bool:
         return False
 
 
+def checkInt(input: str) -> bool:
+    """
+    This function take in a string and test does it can be convert to int
+    """
+    try:
+        int(input)
+        return True
+    except ValueError:
+        return False
+
+
 if __name__ == '__main__':
     # get the help info
     helpDict = getHelp()
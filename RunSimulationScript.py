@@ -24,6 +24,40 @@ def runSimulation(trail, simple, unstuckProbability):
     simulatorType = 2
     interactType = "DOT"
     # interactType = "CUTOFF"
+    energyEngine = "DIRECT"
+    # energyEngine = "FFT"
+    # energyEngine = "PYRAMID"
+    # energyEngine = "PRUNED"
+    # energyEngine = "SLIDING"
+    # energyEngine = "WINDOW"
+    # energyEngine = "PACKED"
+    # energyEngine = "SPARSE"
+    # energyEngine = "SPARSE_FILM"
+    # energyEngine = "TILED"
+    # energyEngine = "AUTO"
+    # film file scanned by TILED engine, and number of positions on each side of one tile
+    filmPath = ""
+    tileSize = 2048
+    recordTrace = False
+    topK = 1
+    minSeparation = 0
+    saveEnergyMap = False
+    # how layers of 3D bacteria interact with the film, "CONTACT", "COULOMB" or "SCREENED"
+    energyModel = "CONTACT"
+    screeningLength = 10.0
+    # number of orientations of bacteria scanned, 1, 2, 4 or 8
+    orientationNumber = 1
+    # file of finished iterations for simulation type 2 and 3, rerun with the same file skip them
+    checkpointPath = ""
+    # memory can be used by the spectra of films and bacteria kept in simulation type 4, in bytes
+    spectrumCacheLimit = 2 * 1024 ** 3
+    # folder keeps the spectra, integral images and pyramid levels of films for later scans, "" is not kept
+    surfaceCachePath = ""
+    # "PROCESS" or "THREAD" pool runs the scan, "THREAD" only for "SLIDING", "WINDOW", "PACKED", "SPARSE",
+    # "SPARSE_FILM", "TILED" and "AUTO"
+    poolBackend = "PROCESS"
+    # threads of BLAS used by each worker
+    blasThreadNum = 1
 
     message = setIndicator(writeImage, recordLog, writeAtLast, printMessage, simulatorType)
     showMessage(message)
@@ -98,7 +132,14 @@ def runSimulation(trail, simple, unstuckProbability):
     if simulatorType == 1:
         simulator = EnergySimulator
         # taking info for energy scan simulation
-        parameter = {"interactType": interactType, "simulationType": simulationType, "cutoff": cutoff}
+        parameter = {"interactType": interactType, "simulationType": simulationType, "cutoff": cutoff,
+                     "energyEngine": energyEngine, "recordTrace": recordTrace, "topK": topK,
+                     "minSeparation": minSeparation, "saveEnergyMap": saveEnergyMap, "filmPath": filmPath,
+                     "tileSize": tileSize, "checkpointPath": checkpointPath,
+                     "energyModel": energyModel, "screeningLength": screeningLength,
+                     "orientationNumber": orientationNumber, "spectrumCacheLimit": spectrumCacheLimit,
+                     "surfaceCachePath": surfaceCachePath, "poolBackend": poolBackend,
+                     "blasThreadNum": blasThreadNum}
 
     elif simulatorType == 2:
         simulator = DynamicSimulator
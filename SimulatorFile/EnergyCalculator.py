@@ -2,24 +2,63 @@
 This program:
 - Calculates the energy of the surface
 """
-from copy import deepcopy
 from functools import partial
-from typing import Tuple, List, Union
+from typing import Tuple, List, Union, Iterator, Callable, Dict
+import heapq
 import time
 
 from ExternalIO import *
-import multiprocessing as mp
+from SimulatorFile.EnergyEngine import ENERGY_DECIMALS, TRACE_DTYPE, BATCH_MEMORY_LIMIT, SCREENING_LENGTH, \
+    ORIENTATION, layerWeight, bacteriaKernel, orientKernel, orientationName, \
+    scanPosition, fftShape, kernelSpectrum, correlateSpectrum, slidingEnergy, windowViewEnergy, packKernel, \
+    packedEnergy, kernelDomain, filmValue, sparseKernelEnergy, batchSize, chargeMap, chargeIntegral, boxSum, \
+    energyBound, cutoffEnergyMap, minimumEnergy, minimumCharge, scanTrace, neighbourCount, sortPosition, \
+    lowestPosition, separatedMinimum, mergeResult
+from SimulatorFile.EnergySearch import PYRAMID_CANDIDATE, PYRAMID_AGREEMENT, pyramidSearch, checkPyramid
+from SimulatorFile.EnergyTile import TILE_SIZE, openFilm, tileGrid, tileEnergy
+from SimulatorFile.SharedSurface import SharedDescriptor, shareArray, attachArray, releaseArray
+from SimulatorFile.EnergyPool import EnergyPool, ThreadEnergyPool, cpuNumber, attachFilm
+from SimulatorFile.SpectrumCache import SPECTRUM_CACHE_LIMIT, SpectrumCache
+from SimulatorFile.SparseFilm import SparseFilm, sparseFilm, filmBox, denseFilm, sparseFilmEnergy, sparseFilmCharge
+from SimulatorFile.SurfaceCache import CACHE_PATH, cachedSpectrum, cachedChargeMap, setCachePath
+from SimulatorFile.EnergySelect import AUTO_ENGINE, CALIBRATE_SAMPLE, COST_CONSTANT, scanFeature, fitConstant, \
+    selectEngine, availableMemory, filmDomainDensity
+from SimulatorFile.EnergyTune import TUNE_CACHE, DEFAULT_PARTITION, partitionCandidate, tuneSample, balancedChunk
 
 FIX_2D_HEIGHT = 2
 
+# contact layer of 3D bacteria, key is the shape of bacteria array, value is the empty mask and the layer index
+CONTACT_LAYER = {}
+
 
 def interact(interactType: str, intervalX: int, intervalY: int, film: ndarray, bacteria: ndarray, currIter: int,
-             cutoff: int, dimension: int) \
+             cutoff: int, dimension: int, engine: str = "DIRECT", recordTrace: bool = False,
+             candidate: int = PYRAMID_CANDIDATE, topK: int = 1, minSeparation: int = 0, saveEnergyMap: bool = False,
+             pool: EnergyPool = None, autoTune: bool = False, energyModel: str = "CONTACT",
+             screeningLength: float = SCREENING_LENGTH, pyramidCheck: bool = False) \
         -> Tuple[Union[float, int], int, int, Union[float, int], Union[float, int], int, int]:
     """
     Do the simulation, scan whole film surface with bacteria
     the format of ndarray pass to simulator is in format (z,y,x), when make np.ones(1,2,3)
     which means 1 z layer, 2 y layer and 3 x layer.
+    engine is the way to calculate energy, "DIRECT" calculate np.dot at each position with multiprocess,
+    "FFT" calculate energy of all positions in one pass by FFT cross correlation, CUTOFF is a box filter of it
+    "PYRAMID" search coarse to fine on a downsampled film, keep candidate positions at each level, only for DOT
+    "PRUNED" is DIRECT skip the positions whose lower bound of energy is above the minimum found, only for DOT
+    "SLIDING" is DIRECT reuse the column correlations of the bacteria along each row, only for DOT
+    "WINDOW" is DIRECT multiply a block of windows of the window view of film with the bacteria at once, only for DOT
+    "PACKED" is DIRECT count the bits of +1 and -1 film points packed in 64 bits words, only for DOT
+    "SPARSE" is DIRECT calculate only the domain points of bacteria on top of its surface charge, only for DOT
+    "SPARSE_FILM" keep the film as its surface charge and domain points, calculate only the domain points, only for DOT
+    "AUTO" choose the engine predicted fastest by the cost model in EnergySelect, from the exact engines can scan it
+    recordTrace indicate save the energy and charge of every position scanned into a .npy record array or not
+    If topK larger than 1, also save the topK lowest energy positions at least minSeparation away from each other
+    saveEnergyMap indicate save the energy of every position scanned into a float32 .npy file or not
+    pool is the process pool reused by all scans of the simulator, if None, a pool is started only for this scan
+    autoTune indicate time the partitions of the pool engine on a sample before its first scan of this film and
+    bacteria shape
+    energyModel and screeningLength set how the layers of 3D bacteria interact with the film, see layerWeight
+    pyramidCheck indicate compare the minimum of "PYRAMID" with the exhaustive search and show how often they agree
     """
     writeLog("This is interact{}D in Simulation".format(dimension))
     showMessage("Start to interact ......")
@@ -83,57 +122,133 @@ def interact(interactType: str, intervalX: int, intervalY: int, film: ndarray, b
     writeLog("shape is : {}, range_x is: {}, range_y is: {}".format(film_shape, range_x, range_y))
     showMessage("len(range_x) is:{}".format(len(range_x)))
 
-    # using partial to set all the constant variables
-    _calculateEnergyConstant = partial(_calculateEnergy, cutoff=cutoff, interactType=interactType,
-                                       bacteriaShape=bact_shape)
-
-    # init parameter for multiprocess
-    # minus 2 in case of other possible process is running
-    ncpus = max(int(os.environ.get('SLURM_CPUS_PER_TASK', default=1)), 1)
-
-    # depends on the interact type, using different methods to set paters
-    # this step is caused by numpy is a parallel package, when doing DOT, using np.dot so need to give some cpu for it
-
-    # based on test on Compute Canada beluga server, this method is fastest
-    part = len(range_x) // int(np.floor(np.sqrt(ncpus)))
-    processNum = part
-
-    # ncpus = 1
-    # part = len(range_x) // int(np.floor(np.sqrt(ncpus)))
-    # processNum = ncpus
-
-    showMessage("Process number is: {}, ncpu number is: {}, part is: {}".format(processNum, ncpus, part))
-
-    pool = mp.Pool(processes=processNum)
-
     # change the bacteria surface into 1D
     if dimension == 2:
         bacteria_1D = np.reshape(bacteria, (-1))
     else:
-        bacteria_1D = _trans3DTo1D(bacteria)
+        bacteria_1D = _trans3DTo1D(bacteria, energyModel, screeningLength)
+
+    # choose the engine predicted fastest by the cost model
+    if engine.upper() == "AUTO":
+        engine = _selectEngine(film, bacteria_1D, bact_shape, range_x, range_y, interactType, pool)
+
+    # number of lowest positions each part need to keep, so the separated minima merged from all parts are exact
+    keep_number = topK * neighbourCount(minSeparation, intervalX, intervalY) if topK > 1 else 0
+
+    # create the file of energy map on the scan positions, the engine fill in the energy calculated
+    energy_map = None
+    if saveEnergyMap:
+        energy_map = createEnergyMap((len(range_x), len(range_y)),
+                                     "EnergyMap_iter_{}_{}_{}".format(currIter, day, current_time))
+
+    if engine.upper() == "FFT":
+        result, min_film, scan_trace, lowest = _calculateEnergyFFT(film, bacteria_1D, bact_shape, range_x, range_y,
+                                                                   interactType, cutoff, recordTrace, keep_number,
+                                                                   energy_map)
+        lowest_list = [lowest]
+
+    elif engine.upper() == "PYRAMID":
+        result, min_film, scan_trace, lowest = _calculateEnergyPyramid(film, bacteria_1D, bact_shape, range_x,
+                                                                       range_y, interactType, candidate,
+                                                                       recordTrace, keep_number, energy_map,
+                                                                       pyramidCheck)
+        lowest_list = [lowest]
+
+    elif engine.upper() in ["DIRECT", "PRUNED", "SLIDING", "WINDOW", "PACKED", "SPARSE", "SPARSE_FILM"]:
+        # using partial to set all the constant variables
+        _calculateEnergyConstant = partial(_calculateEnergyShared, cutoff=cutoff, interactType=interactType,
+                                           bacteriaShape=bact_shape, recordTrace=recordTrace,
+                                           keepNumber=keep_number,
+                                           energyMapPath=None if energy_map is None else energy_map.filename,
+                                           engine=engine.upper())
+
+        # init parameter for multiprocess
+        ncpus = cpuNumber()
+
+        # use the pool of the simulator, or start a pool only for this scan, one process for each cpu
+        scan_pool = pool if pool is not None else EnergyPool(ncpus)
+
+        # film is only shared again if it changed, bacteria is shared for every scan, tasks only carry the name
+        # sparse film is not shared, it is small enough to be carried by the tasks
+        if engine.upper() == "SPARSE_FILM":
+            film_descriptor = sparseFilm(film)
+            showMessage("Sparse film has {} domain points".format(len(film_descriptor[2])))
+        else:
+            film_descriptor = scan_pool.setFilm(film)
+        bacteria_shared, bacteria_descriptor = shareArray(bacteria_1D)
+
+        # only positions inside the film are given to the workers, so every chunk has the same work
+        scan_x, scan_y = scanPosition(film.shape, (bact_shape[1], bact_shape[0]), range_x, range_y)
+
+        try:
+            # film points are checked once when the pool takes the film, not by every part
+            if engine.upper() == "SPARSE" and not scan_pool.filmValue[0]:
+                raise RuntimeError("Sparse scan need all film points to be integers")
+
+            # time the partitions on a sample once for each engine, film shape, bacteria shape and cpu number
+            key = (engine.upper(), film.shape, tuple(bact_shape), ncpus)
+            if autoTune and key not in TUNE_CACHE:
+                TUNE_CACHE[key] = _tunePartition(scan_pool, partial(_calculateEnergyShared, cutoff=cutoff,
+                                                                    interactType=interactType,
+                                                                    bacteriaShape=bact_shape,
+                                                                    engine=engine.upper()),
+                                                 film_descriptor, bacteria_descriptor, scan_x, scan_y, ncpus)
+            processNum, chunkPerProcess, layout = TUNE_CACHE.get(key, (scan_pool.processNum,) + DEFAULT_PARTITION)
+            scan_pool.resize(processNum)
+
+            # each part also carry the index of its first position, to write its block of the energy map
+            data = [(x, y, film_descriptor, bacteria_descriptor, block) for x, y, block in
+                    balancedChunk(scan_x, scan_y, processNum * chunkPerProcess, layout)]
+
+            # each part of sparse film only carry the domain points under its windows
+            if engine.upper() == "SPARSE_FILM":
+                data = [(x, y, filmBox(film_descriptor, x[0], x[-1] + bact_shape[1], y[0], y[-1] + bact_shape[0]),
+                         bacteria, block) for x, y, _, bacteria, block in data]
+
+            showMessage("Process number is: {}, ncpu number is: {}, part number is: {}, layout is: {}".format(
+                processNum, ncpus, len(data), layout))
+
+            # run interact, parts come back once they are done
+            result = list(scan_pool.imapUnordered(_calculateEnergyConstant, data))
+        finally:
+            # release the shared memory even if the scan failed
+            releaseArray(bacteria_shared)
+            if pool is None:
+                scan_pool.close()
+
+        # collect the trace of all parts in order of x then y, None if not record
+        scan_trace = None
+        if recordTrace:
+            scan_trace = np.concatenate([part[2] for part in result] + [np.zeros(0, dtype=TRACE_DTYPE)])
+            scan_trace = scan_trace[np.lexsort((scan_trace["y"], scan_trace["x"]))]
+
+        # collect the lowest positions of all parts, each is sorted
+        lowest_list = [part[3] for part in result]
+
+        # get the minimum result, the window at minimum comes from the part contains the minimum position
+        part_list = result
+        result = mergeResult([part[0] for part in part_list])
+        min_film = next((part[1] for part in part_list if part[0][1:3] == result[1:3]), [])
+
+        if engine.upper() == "PRUNED":
+            pruned = sum(part[4] for part in part_list)
+            showMessage("Pruned search skipped {} of {} positions".format(pruned, len(scan_x) * len(scan_y)))
 
-    # prepare data for multiprocess, data is divided range into various parts, not exceed sqrt of ncpus can use
-    data = []
-
-    # double loop to prepare range x and range y
-    range_x_list = [range_x[i:i + part] for i in range(0, len(range_x), part)]
-    range_y_list = [range_y[i:i + part] for i in range(0, len(range_y), part)]
+    else:
+        raise RuntimeError("Unknown energy engine: {}".format(engine))
 
-    # put combination into data
-    for x in range_x_list:
-        for y in range_y_list:
-            data.append((x, y, deepcopy(film), deepcopy(bacteria_1D)))
+    writeLog("Result in interact {}D is: {}".format(dimension, result))
 
-    # run interact
-    result = pool.map(_calculateEnergyConstant, data)
+    # save the trace of the scan
+    if scan_trace is not None:
+        saveTrace(scan_trace, "EnergyTrace_iter_{}_{}_{}".format(currIter, day, current_time))
 
-    # get the minimum result
-    result.sort()
-    result = result.pop(0)
-    result, min_film, path = result[0], result[1], result[2]
+    # merge the lowest positions of all parts and save the separated minima
+    _saveMinimum(lowest_list, topK, minSeparation, "EnergyMinimum_iter_{}_{}_{}".format(currIter, day, current_time))
 
-    writeLog("Result in interact {}D is: {}".format(dimension, result))
-    writeLog("Path is: {}".format(path))
+    # write the energy map into the file
+    if energy_map is not None:
+        energy_map.flush()
 
     # print the min_film
     visPlot(min_film, "film_at_minimum_{}".format(currIter), 2, date)
@@ -149,10 +264,606 @@ def interact(interactType: str, intervalX: int, intervalY: int, film: ndarray, b
     return result
 
 
+def interactBatch(interactType: str, intervalX: int, intervalY: int, film: ndarray, bacteriaList: List[ndarray],
+                  cutoff: int, dimension: int, recordTrace: bool = False, memoryLimit: int = BATCH_MEMORY_LIMIT,
+                  topK: int = 1, minSeparation: int = 0, saveEnergyMap: bool = False, energyModel: str = "CONTACT",
+                  screeningLength: float = SCREENING_LENGTH, iterList: List[int] = None) \
+        -> Iterator[Tuple[Union[float, int], int, int, Union[float, int], Union[float, int], int, int]]:
+    """
+    Scan one film with every bacteria in bacteriaList by FFT, all bacteria need to have the same shape
+    The film spectrum and charge map are prepared once, bacteria are scanned in batches under memoryLimit bytes
+    Yield the result of each bacteria in the same format as interact, in the order of bacteriaList
+    topK, minSeparation, saveEnergyMap, energyModel and screeningLength work same as interact for each bacteria
+    iterList is the iteration of each bacteria used in the name of its files, if None, the index in bacteriaList
+    """
+    writeLog("This is interactBatch{}D in Simulation".format(dimension))
+    showMessage("Start to interact {} bacteria in batch ......".format(len(bacteriaList)))
+
+    # get time for the folder to save image
+    now = datetime.now()
+    day = now.strftime("%m_%d")
+    current_time = now.strftime("%H_%M_%S")
+    date = {"day": day,
+            "current_time": current_time}
+
+    # currently, all film uses will be convert to 2D, only show the film once
+    visPlot(film[0] if dimension == 2 else film, "whole_film_{}D_0".format(dimension), dimension, date)
+    film = film[0]
+
+    # set the range
+    range_x = np.arange(0, film.shape[1], intervalX)
+    range_y = np.arange(0, film.shape[0], intervalY)
+
+    # shape of bacteria in 2D, all bacteria have the same shape
+    bact_shape = bacteriaList[0].shape[1:]
+    kernel_shape = (bact_shape[1], bact_shape[0])
+
+    # prepare the film once for all bacteria
+    startTime = time.time()
+    shape = fftShape(film.shape)
+    map_shape = (film.shape[0] - kernel_shape[0] + 1, film.shape[1] - kernel_shape[1] + 1)
+    film_fft = cachedSpectrum(film, shape)
+    charge = cachedChargeMap(film, kernel_shape)
+    batch = batchSize(shape, memoryLimit)
+    keep_number = topK * neighbourCount(minSeparation, intervalX, intervalY) if topK > 1 else 0
+
+    showMessage("Film prepared in {} seconds, batch size is: {}".format(time.time() - startTime, batch))
+
+    if iterList is None:
+        iterList = list(range(len(bacteriaList)))
+
+    for start in range(0, len(bacteriaList), batch):
+        startTime = time.time()
+
+        # change the bacteria surface into 1D
+        bacteria_1D_list = []
+        for index in range(start, min(start + batch, len(bacteriaList))):
+            bacteria = bacteriaList[index]
+            currIter = iterList[index]
+            if bacteria.shape[1:] != bact_shape:
+                raise RuntimeError("All bacteria in batch scan need same shape, bacteria {} has shape {}".format(
+                    currIter, bacteria.shape))
+
+            if dimension == 2:
+                visPlot(bacteria[0], "whole_bacteria_2D_{}".format(currIter), 2, date)
+                bacteria_1D_list.append(np.reshape(bacteria[0], (-1)))
+            elif dimension == 3:
+                visPlot(bacteria, "whole_bacteria_3D_{}".format(currIter), 3, date)
+                bacteria_1D_list.append(_trans3DTo1D(bacteria, energyModel, screeningLength))
+            else:
+                raise RuntimeError("Unknown dimension in Energy Calculator")
+
+        # calculate the energy map of this batch in one pass
+        kernels = np.stack([bacteriaKernel(bacteria_1D, bact_shape) for bacteria_1D in bacteria_1D_list])
+        energy_maps = correlateSpectrum(film_fft, kernelSpectrum(kernels, shape), shape, map_shape)
+
+        showMessage("Batch start at {} done in {} seconds".format(start, time.time() - startTime))
+
+        # find the result of each bacteria
+        for i, bacteria_1D in enumerate(bacteria_1D_list):
+            currIter = iterList[start + i]
+
+            # create the file of energy map on the scan positions for this bacteria
+            energy_map = None
+            if saveEnergyMap:
+                energy_map = createEnergyMap((len(range_x), len(range_y)),
+                                             "EnergyMap_iter_{}_{}_{}".format(currIter, day, current_time))
+
+            result, min_film, scan_trace, lowest = _reduceEnergyMap(film, bacteria_1D, bact_shape, energy_maps[i],
+                                                                    charge, range_x, range_y, interactType, cutoff,
+                                                                    recordTrace, keep_number, energy_map)
+
+            writeLog("Result in interactBatch {}D of bacteria {} is: {}".format(dimension, currIter, result))
+
+            # save the trace of the scan
+            if scan_trace is not None:
+                saveTrace(scan_trace, "EnergyTrace_iter_{}_{}_{}".format(currIter, day, current_time))
+
+            # save the separated minima and the energy map
+            _saveMinimum([lowest], topK, minSeparation,
+                         "EnergyMinimum_iter_{}_{}_{}".format(currIter, day, current_time))
+            if energy_map is not None:
+                energy_map.flush()
+
+            # print the min_film
+            visPlot(min_film, "film_at_minimum_{}".format(currIter), 2, date)
+
+            yield result
+
+    showMessage("Interact in batch done")
+
+
+def interactMatrix(interactType: str, intervalX: int, intervalY: int, filmList: List[ndarray],
+                   bacteriaList: List[ndarray], cutoff: int, dimension: int, recordTrace: bool = False,
+                   cacheLimit: int = SPECTRUM_CACHE_LIMIT, topK: int = 1, minSeparation: int = 0,
+                   saveEnergyMap: bool = False, energyModel: str = "CONTACT",
+                   screeningLength: float = SCREENING_LENGTH) \
+        -> Iterator[Tuple[int, int, Tuple]]:
+    """
+    Scan every film in filmList with every bacteria in bacteriaList by FFT, all films and all bacteria need to have
+    the same shape
+    The spectrum and charge map of each film and the spectrum of each bacteria are kept in a least recently used cache
+    under cacheLimit bytes, so each pair only need one product and one inverse transform
+    Bacteria are scanned in blocks whose spectra fit in the cache with one film, films are only prepared again for the
+    next block, so with one block every film and every bacteria is transformed once
+    Yield (index of film, index of bacteria, result in the same format as interact), film by film in each block
+    Files are saved with the iteration index of film * number of bacteria + bacteria
+    """
+    writeLog("This is interactMatrix{}D in Simulation".format(dimension))
+    showMessage("Start to interact {} films with {} bacteria ......".format(len(filmList), len(bacteriaList)))
+
+    # get time for the folder to save image
+    now = datetime.now()
+    day = now.strftime("%m_%d")
+    current_time = now.strftime("%H_%M_%S")
+    date = {"day": day,
+            "current_time": current_time}
+
+    # all films and all bacteria have the same shape, so they share one FFT shape
+    for name, surfaceList in [("film", filmList), ("bacteria", bacteriaList)]:
+        for i, surface in enumerate(surfaceList):
+            if surface.shape != surfaceList[0].shape:
+                raise RuntimeError("All {} in matrix scan need same shape, {} {} has shape {}".format(
+                    name, name, i, surface.shape))
+
+    # currently, all film uses will be convert to 2D
+    film_shape = filmList[0].shape[1:]
+    bact_shape = bacteriaList[0].shape[1:]
+    kernel_shape = (bact_shape[1], bact_shape[0])
+
+    # set the range
+    range_x = np.arange(0, film_shape[1], intervalX)
+    range_y = np.arange(0, film_shape[0], intervalY)
+
+    shape = fftShape(film_shape)
+    map_shape = (film_shape[0] - kernel_shape[0] + 1, film_shape[1] - kernel_shape[1] + 1)
+    keep_number = topK * neighbourCount(minSeparation, intervalX, intervalY) if topK > 1 else 0
+
+    # number of bacteria kept together with the spectrum and charge map of one film,
+    # 3D bacteria also keep its 1D surface
+    spectrum_bytes = shape[0] * (shape[1] // 2 + 1) * np.dtype(np.complex128).itemsize
+    if dimension == 3:
+        spectrum_bytes += kernel_shape[0] * kernel_shape[1] * np.dtype(np.float64).itemsize
+    film_bytes = spectrum_bytes + map_shape[0] * map_shape[1] * np.dtype(np.int64).itemsize
+    block = max(1, int((cacheLimit - film_bytes) // spectrum_bytes))
+    cache = SpectrumCache(cacheLimit)
+
+    showMessage("Bacteria block size is: {}".format(block))
+
+    bacteriaNum = len(bacteriaList)
+    for start in range(0, bacteriaNum, block):
+        for filmIndex, film in enumerate(filmList):
+            film_2D, film_fft, charge = cache.get(("film", filmIndex),
+                                                  partial(_prepareFilm, film, filmIndex, dimension, shape,
+                                                          kernel_shape, date))
+
+            for bacteriaIndex in range(start, min(start + block, bacteriaNum)):
+                bacteria_1D, kernel_fft = cache.get(("bacteria", bacteriaIndex),
+                                                    partial(_prepareBacteria, bacteriaList[bacteriaIndex],
+                                                            bacteriaIndex, dimension, shape, energyModel,
+                                                            screeningLength, date))
+                currIter = filmIndex * bacteriaNum + bacteriaIndex
+
+                # create the file of energy map on the scan positions for this pair
+                energy_map = None
+                if saveEnergyMap:
+                    energy_map = createEnergyMap((len(range_x), len(range_y)),
+                                                 "EnergyMap_iter_{}_{}_{}".format(currIter, day, current_time))
+
+                result, min_film, scan_trace, lowest = _reduceEnergyMap(
+                    film_2D, bacteria_1D, bact_shape, correlateSpectrum(film_fft, kernel_fft, shape, map_shape),
+                    charge, range_x, range_y, interactType, cutoff, recordTrace, keep_number, energy_map)
+
+                writeLog("Result in interactMatrix {}D of film {} and bacteria {} is: {}".format(
+                    dimension, filmIndex, bacteriaIndex, result))
+
+                # save the trace of the scan
+                if scan_trace is not None:
+                    saveTrace(scan_trace, "EnergyTrace_iter_{}_{}_{}".format(currIter, day, current_time))
+
+                # save the separated minima and the energy map
+                _saveMinimum([lowest], topK, minSeparation,
+                             "EnergyMinimum_iter_{}_{}_{}".format(currIter, day, current_time))
+                if energy_map is not None:
+                    energy_map.flush()
+
+                # print the min_film
+                visPlot(min_film, "film_at_minimum_{}".format(currIter), 2, date)
+
+                yield filmIndex, bacteriaIndex, result
+
+    showMessage("Interact in matrix done, {} spectra calculated, {} reused".format(cache.miss, cache.hit))
+
+
+def _prepareFilm(film: ndarray, filmIndex: int, dimension: int, shape: Tuple[int, int], kernelShape: Tuple[int, int],
+                 date: Dict[str, str]) -> Tuple[ndarray, ndarray, ndarray]:
+    """
+    This function show the film and calculate its spectrum and charge map for interactMatrix
+    """
+    visPlot(film[0] if dimension == 2 else film, "whole_film_{}D_{}".format(dimension, filmIndex), dimension, date)
+    film = film[0]
+
+    return film, cachedSpectrum(film, shape), cachedChargeMap(film, kernelShape)
+
+
+def _prepareBacteria(bacteria: ndarray, bacteriaIndex: int, dimension: int, shape: Tuple[int, int],
+                     energyModel: str, screeningLength: float, date: Dict[str, str]) -> Tuple[ndarray, ndarray]:
+    """
+    This function show the bacteria and calculate its 1D surface and spectrum for interactMatrix
+    """
+    if dimension == 2:
+        visPlot(bacteria[0], "whole_bacteria_2D_{}".format(bacteriaIndex), 2, date)
+        bacteria_1D = np.reshape(bacteria[0], (-1))
+    elif dimension == 3:
+        visPlot(bacteria, "whole_bacteria_3D_{}".format(bacteriaIndex), 3, date)
+        bacteria_1D = _trans3DTo1D(bacteria, energyModel, screeningLength)
+    else:
+        raise RuntimeError("Unknown dimension in Energy Calculator")
+
+    return bacteria_1D, kernelSpectrum(bacteriaKernel(bacteria_1D, bacteria.shape[1:]), shape)
+
+
+def interactOrientation(interactType: str, intervalX: int, intervalY: int, film: ndarray, bacteria: ndarray,
+                        currIter: int, cutoff: int, dimension: int, orientationNumber: int = len(ORIENTATION),
+                        recordTrace: bool = False, topK: int = 1, minSeparation: int = 0, saveEnergyMap: bool = False,
+                        energyModel: str = "CONTACT", screeningLength: float = SCREENING_LENGTH,
+                        memoryLimit: int = BATCH_MEMORY_LIMIT) \
+        -> Tuple[Tuple[Union[float, int], int, int, Union[float, int], Union[float, int], int, int], int]:
+    """
+    Scan the film with the first orientationNumber orientations of bacteria in ORIENTATION by FFT
+    The film spectrum is prepared once, orientations with the same kernel shape are scanned in one batch
+    Return the result in the same format as interact of the orientation has the lowest energy, and the index of this
+    orientation in ORIENTATION, same energy is broken by the smaller index
+    recordTrace, topK and saveEnergyMap save the files of each orientation, other parameters work same as interact
+    """
+    writeLog("This is interactOrientation{}D in Simulation".format(dimension))
+    showMessage("Start to interact {} orientations ......".format(orientationNumber))
+
+    if orientationNumber < 1 or orientationNumber > len(ORIENTATION):
+        raise RuntimeError("Orientation number need to be 1 to {}, orientation number is: {}".format(
+            len(ORIENTATION), orientationNumber))
+
+    # get time for the folder to save image
+    now = datetime.now()
+    day = now.strftime("%m_%d")
+    current_time = now.strftime("%H_%M_%S")
+    date = {"day": day,
+            "current_time": current_time}
+
+    # change the film and bacteria into 2D, the kernel is rotated and mirrored in 2D
+    if dimension == 2:
+        film = film[0]
+        bacteria = bacteria[0]
+        if currIter == 0:
+            visPlot(film, "whole_film_2D_{}".format(currIter), 2, date)
+        visPlot(bacteria, "whole_bacteria_2D_{}".format(currIter), 2, date)
+        bacteria_1D = np.reshape(bacteria, (-1))
+        bact_shape = bacteria.shape
+    elif dimension == 3:
+        visPlot(film, "whole_film_3D_{}".format(currIter), 3, date)
+        visPlot(bacteria, "whole_bacteria_3D_{}".format(currIter), 3, date)
+        film = film[0]
+        bacteria_1D = _trans3DTo1D(bacteria, energyModel, screeningLength)
+        bact_shape = bacteria.shape[1:]
+    else:
+        raise RuntimeError("Unknown dimension in Energy Calculator")
+
+    kernel = bacteriaKernel(bacteria_1D, bact_shape)
+
+    # set the range
+    range_x = np.arange(0, film.shape[1], intervalX)
+    range_y = np.arange(0, film.shape[0], intervalY)
+
+    # prepare the film once for all orientations
+    startTime = time.time()
+    shape = fftShape(film.shape)
+    film_fft = cachedSpectrum(film, shape)
+    batch = batchSize(shape, memoryLimit)
+    keep_number = topK * neighbourCount(minSeparation, intervalX, intervalY) if topK > 1 else 0
+
+    # orientations with the same kernel shape are in the same group
+    groups = {}
+    for orientation in range(orientationNumber):
+        oriented = orientKernel(kernel, orientation)
+        groups.setdefault(oriented.shape, []).append((orientation, oriented))
+
+    best = None
+    best_orientation = -1
+    best_film = []
+    for kernel_shape, group in groups.items():
+        map_shape = (film.shape[0] - kernel_shape[0] + 1, film.shape[1] - kernel_shape[1] + 1)
+        charge = cachedChargeMap(film, kernel_shape)
+
+        for start in range(0, len(group), batch):
+            part = group[start: start + batch]
+
+            # calculate the energy map of the orientations in this batch in one pass
+            kernels = np.stack([oriented for _, oriented in part])
+            energy_maps = correlateSpectrum(film_fft, kernelSpectrum(kernels, shape), shape, map_shape)
+
+            for (orientation, oriented), energy in zip(part, energy_maps):
+                name = "iter_{}_orient_{}_{}_{}".format(currIter, orientation, day, current_time)
+
+                energy_map = None
+                if saveEnergyMap:
+                    energy_map = createEnergyMap((len(range_x), len(range_y)), "EnergyMap_" + name)
+
+                result, min_film, scan_trace, lowest = _reduceEnergyMap(film, np.reshape(oriented, (-1,)),
+                                                                        (kernel_shape[1], kernel_shape[0]), energy,
+                                                                        charge, range_x, range_y, interactType, cutoff,
+                                                                        recordTrace, keep_number, energy_map)
+
+                writeLog("Result of orientation {} is: {}".format(orientationName(orientation), result))
+
+                # save the files of this orientation
+                if scan_trace is not None:
+                    saveTrace(scan_trace, "EnergyTrace_" + name)
+                _saveMinimum([lowest], topK, minSeparation, "EnergyMinimum_" + name)
+                if energy_map is not None:
+                    energy_map.flush()
+
+                # keep the lowest energy, same energy keep the smaller orientation
+                key = (np.round(result[0], ENERGY_DECIMALS), orientation)
+                if best is None or key < (np.round(best[0], ENERGY_DECIMALS), best_orientation):
+                    best = result
+                    best_orientation = orientation
+                    best_film = min_film
+
+    showMessage("Interact {} orientations done in {} seconds, lowest energy is at orientation: {}".format(
+        orientationNumber, time.time() - startTime, orientationName(best_orientation)))
+    writeLog("Result in interactOrientation {}D is: {}, orientation is: {}".format(dimension, best,
+                                                                                  best_orientation))
+
+    # print the min_film
+    visPlot(best_film, "film_at_minimum_{}".format(currIter), 2, date)
+
+    return best, best_orientation
+
+
+def interactTiled(interactType: str, intervalX: int, intervalY: int, filmPath: str, bacteria: ndarray, currIter: int,
+                  dimension: int, tileSize: int = TILE_SIZE, recordTrace: bool = False, topK: int = 1,
+                  minSeparation: int = 0, saveEnergyMap: bool = False, pool: EnergyPool = None,
+                  energyModel: str = "CONTACT", screeningLength: float = SCREENING_LENGTH) \
+        -> Tuple[Union[float, int], int, int, Union[float, int], Union[float, int], int, int]:
+    """
+    Scan the film saved in filmPath with bacteria, the film is memory mapped and never read into memory as a whole
+    Positions are split into tiles of tileSize, each tile with a bacteria sized halo is read and scanned by FFT in
+    one process, the minimum of all tiles are merged, memory used is bounded by the tile size, only for DOT
+    Return the same format as interact, other parameters work same as interact
+    """
+    writeLog("This is interactTiled{}D in Simulation".format(dimension))
+    showMessage("Start to interact in tiles ......")
+
+    if interactType.upper() != "DOT":
+        raise RuntimeError("TILED engine only support DOT interact, interact type is: {}".format(interactType))
+
+    # get time for the folder to save image
+    now = datetime.now()
+    day = now.strftime("%m_%d")
+    current_time = now.strftime("%H_%M_%S")
+    date = {"day": day,
+            "current_time": current_time}
+
+    startTime = time.time()
+
+    # film is too large to plot, only show the bacteria
+    film = openFilm(filmPath)
+    if dimension == 2:
+        bacteria = bacteria[0]
+        visPlot(bacteria, "whole_bacteria_2D_{}".format(currIter), 2, date)
+        bact_shape = bacteria.shape
+        bacteria_1D = np.reshape(bacteria, (-1))
+    elif dimension == 3:
+        visPlot(bacteria, "whole_bacteria_3D_{}".format(currIter), 3, date)
+        bact_shape = bacteria.shape[1:]
+        bacteria_1D = _trans3DTo1D(bacteria, energyModel, screeningLength)
+    else:
+        raise RuntimeError("Unknown dimension in Energy Calculator")
+
+    # set the range, same as interact
+    range_x = np.arange(0, film.shape[1], intervalX)
+    range_y = np.arange(0, film.shape[0], intervalY)
+    kernel = bacteriaKernel(bacteria_1D, bact_shape)
+    scan_x, scan_y = scanPosition(film.shape, kernel.shape, range_x, range_y)
+
+    tiles = tileGrid(scan_x, scan_y, tileSize)
+    keep_number = topK * neighbourCount(minSeparation, intervalX, intervalY) if topK > 1 else 0
+
+    # create the file of energy map on the scan positions, each tile write its own block
+    energy_map = None
+    if saveEnergyMap:
+        energy_map = createEnergyMap((len(range_x), len(range_y)),
+                                     "EnergyMap_iter_{}_{}_{}".format(currIter, day, current_time))
+
+    # create the file of trace in order of x then y, each tile write its own block, no trace is kept in memory
+    scan_trace = None
+    if recordTrace:
+        scan_trace = createTrace(len(scan_x) * len(scan_y), TRACE_DTYPE,
+                                 "EnergyTrace_iter_{}_{}_{}".format(currIter, day, current_time))
+
+    # use the pool of the simulator, or start a pool only for this scan
+    scan_pool = pool if pool is not None else EnergyPool(max(min(cpuNumber(), len(tiles)), 1))
+    showMessage("Film shape is: {}, tile number is: {}, process number is: {}".format(film.shape, len(tiles),
+                                                                                        scan_pool.processNum))
+
+    _calculateEnergyConstant = partial(_calculateEnergyTile, filmPath=filmPath, kernel=kernel, keepNumber=keep_number,
+                                       tracePath=None if scan_trace is None else scan_trace.filename,
+                                       scanShape=(len(scan_x), len(scan_y)),
+                                       energyMapPath=None if energy_map is None else energy_map.filename)
+
+    # tiles are done in any order, only keep the small result of each tile
+    results = []
+    lowest_list = []
+    try:
+        for result, lowest in scan_pool.imapUnordered(_calculateEnergyConstant, tiles):
+            results.append(result)
+            lowest_list.append(lowest)
+    finally:
+        if pool is None:
+            scan_pool.close()
+
+    result = mergeResult(results)
+    writeLog("Result in interactTiled {}D is: {}".format(dimension, result))
+
+    _saveMinimum(lowest_list, topK, minSeparation, "EnergyMinimum_iter_{}_{}_{}".format(currIter, day, current_time))
+
+    if energy_map is not None:
+        energy_map.flush()
+
+    if scan_trace is not None:
+        scan_trace.flush()
+
+    # read the window at minimum from the film
+    if result[1] >= 0:
+        min_film = np.array(film[result[1]: result[1] + kernel.shape[0], result[2]: result[2] + kernel.shape[1]])
+        visPlot(min_film, "film_at_minimum_{}".format(currIter), 2, date)
+
+    showMessage("Interact in tiles done")
+    showMessage(f"Total time it took for calculating energy is {time.time() - startTime} seconds")
+
+    return result
+
+
+def _selectEngine(film: ndarray, bacteria: ndarray, bacteriaShape: Tuple, range_x: ndarray, range_y: ndarray,
+                  interactType: str, pool: EnergyPool = None) -> str:
+    """
+    This function choose the engine for AUTO, the fastest one predicted by the cost model whose memory fits
+    The constants of the cost model are calibrated before the first choice of this process
+    """
+    if len(COST_CONSTANT) == 0:
+        _calibrateCost()
+
+    kernel = bacteriaKernel(bacteria, bacteriaShape)
+    scan_x, scan_y = scanPosition(film.shape, kernel.shape, range_x, range_y)
+
+    # engines can scan this film and bacteria, threads only run the engines release the GIL
+    # film points are checked once when the pool of the simulator takes the film, not for every scan
+    if pool is not None:
+        pool.setFilm(film)
+        integer, ternary = pool.filmValue
+    else:
+        integer, ternary = filmValue(film)
+    # DIRECT in CUTOFF also sums the cutoff range of every position, which the cost model does not count,
+    # FFT gets the same CUTOFF energy in one pass, so it is the only engine for CUTOFF
+    candidate = ["FFT"]
+    if interactType.upper() == "DOT":
+        candidate += ["DIRECT", "SLIDING", "WINDOW", "SPARSE_FILM"]
+        if integer:
+            candidate.append("SPARSE")
+        if ternary:
+            candidate.append("PACKED")
+    if isinstance(pool, ThreadEnergyPool) and "DIRECT" in candidate:
+        candidate.remove("DIRECT")
+
+    workload = (film.shape, kernel.shape, scan_x, scan_y, len(kernelDomain(kernel)[1]), len(packKernel(kernel)[0]),
+                filmDomainDensity(film))
+    workerNum = pool.processNum if pool is not None else cpuNumber()
+    engine, seconds, memory, prediction = selectEngine(candidate, workload, workerNum, availableMemory())
+
+    for name, (candidateSeconds, candidateMemory) in prediction.items():
+        writeLog("Engine {} is predicted to use {} seconds and {} bytes".format(name, candidateSeconds,
+                                                                                candidateMemory))
+    showMessage("AUTO engine choose {}, predicted time is {:.4f} seconds, predicted memory is {:.1f} MB".format(
+        engine, seconds, memory / 1024 ** 2))
+
+    return engine
+
+
+def _calibrateCost() -> None:
+    """
+    This function time every engine of AUTO in this process on the calibrate samples, and fit the constants of
+    the cost model from the time used
+    """
+    rng = np.random.default_rng(0)
+    feature_list = {engine: [] for engine in AUTO_ENGINE}
+    time_list = {engine: [] for engine in AUTO_ENGINE}
+
+    startTime = time.perf_counter()
+    # samples are random films, they are not saved into the surface cache of the user
+    cachePath = CACHE_PATH[0]
+    setCachePath("")
+    try:
+        for filmSize, bacteriaSize, interval in CALIBRATE_SAMPLE:
+            # film of a few domain points on its surface charge, so SPARSE_FILM is timed at a scale like its use
+            film = rng.choice([-1, 0, 1], size=(filmSize, filmSize), p=(0.05, 0.05, 0.9)).astype(float)
+            bacteria = rng.choice([-1, 0, 1], size=bacteriaSize * bacteriaSize).astype(float)
+            bact_shape = (bacteriaSize, bacteriaSize)
+            kernel = bacteriaKernel(bacteria, bact_shape)
+            range_x = np.arange(0, filmSize, interval)
+            range_y = np.arange(0, filmSize, interval)
+            scan_x, scan_y = scanPosition(film.shape, kernel.shape, range_x, range_y)
+            data = (scan_x, scan_y, film, bacteria)
+
+            scan = {"FFT": lambda: _calculateEnergyFFT(film, bacteria, bact_shape, range_x, range_y, "DOT"),
+                    "DIRECT": lambda: _calculateEnergy(data, "DOT", bact_shape),
+                    "SLIDING": lambda: _calculateEnergySliding(data, "DOT", bact_shape),
+                    "WINDOW": lambda: _calculateEnergyWindow(data, "DOT", bact_shape),
+                    "PACKED": lambda: _calculateEnergyPacked(data, "DOT", bact_shape),
+                    "SPARSE": lambda: _calculateEnergySparse(data, "DOT", bact_shape),
+                    "SPARSE_FILM": lambda: _calculateEnergySparseFilm((scan_x, scan_y, sparseFilm(film), bacteria),
+                                                                      "DOT", bact_shape)}
+
+            workload = (film.shape, kernel.shape, scan_x, scan_y, len(kernelDomain(kernel)[1]),
+                        len(packKernel(kernel)[0]), filmDomainDensity(film))
+            # the first scan of each engine also load the code and the buffers, it is not timed
+            if len(time_list["FFT"]) == 0:
+                for engine in AUTO_ENGINE:
+                    scan[engine]()
+
+            for engine in AUTO_ENGINE:
+                engineTime = time.perf_counter()
+                scan[engine]()
+                time_list[engine].append(time.perf_counter() - engineTime)
+                feature_list[engine].append(scanFeature(engine, workload))
+    finally:
+        setCachePath(cachePath)
+
+    for engine in AUTO_ENGINE:
+        COST_CONSTANT[engine] = fitConstant(feature_list[engine], time_list[engine])
+        writeLog("Cost constants of engine {} are: {}".format(engine, COST_CONSTANT[engine]))
+
+    showMessage("Cost model calibrated in {:.3f} seconds".format(time.perf_counter() - startTime))
+
+
+def _tunePartition(scanPool: EnergyPool, func: Callable, filmDescriptor: SharedDescriptor,
+                   bacteriaDescriptor: SharedDescriptor, range_x: ndarray, range_y: ndarray, ncpus: int) \
+        -> Tuple[int, int, str]:
+    """
+    This function time every candidate partition on a sample of the scan, return the fastest one
+    func is the multiprocess helper function without record anything
+    """
+    sample_x, sample_y = tuneSample(range_x, range_y)
+
+    best_time = float("INF")
+    best = None
+    for processNum, chunkPerProcess, layout in partitionCandidate(ncpus):
+        scanPool.resize(processNum)
+        data = [(x, y, filmDescriptor, bacteriaDescriptor, block) for x, y, block in
+                balancedChunk(sample_x, sample_y, processNum * chunkPerProcess, layout)]
+
+        startTime = time.perf_counter()
+        list(scanPool.imapUnordered(func, data))
+        usedTime = time.perf_counter() - startTime
+
+        writeLog("Partition with {} processes, {} chunks per process, layout {} uses {} seconds".format(
+            processNum, chunkPerProcess, layout, usedTime))
+
+        if usedTime < best_time:
+            best_time = usedTime
+            best = (processNum, chunkPerProcess, layout)
+
+    showMessage("Partition tuned on {} positions, process number is: {}, chunk per process is: {}, layout is: {}"
+                .format(len(sample_x) * len(sample_y), *best))
+
+    return best
+
+
 def _calculateEnergy(data: Tuple[ndarray, ndarray, ndarray, ndarray], interactType: str, bacteriaShape: Tuple,
-                     cutoff: int = None):
+                     cutoff: int = None, recordTrace: bool = False, keepNumber: int = 0, outputMap: ndarray = None):
     """
     This is the multiprocess helper function for calculating energy, need 2D film and 1D bacteria
+    If recordTrace, also return a record array of every position scanned, otherwise None
+    Also return the lowest keepNumber positions sorted by sortPosition, and write every energy into outputMap if given
     """
     # init some variable
     range_x = data[0]
@@ -175,11 +886,26 @@ def _calculateEnergy(data: Tuple[ndarray, ndarray, ndarray, ndarray], interactTy
     min_x = -1
     min_y = -1
     min_film = []
-    path = []
+
+    # only allocate the trace when need to record
+    if recordTrace:
+        trace = np.zeros(len(range_x) * len(range_y), dtype=TRACE_DTYPE)
+    else:
+        trace = None
+    trace_size = 0
+
+    # heap of the lowest positions, the largest one is on the top so it is removed first
+    lowest = []
+
+    # calculate the net charge of every window in this part in one step by integral image
+    x_start = range_x[0]
+    y_start = range_y[0]
+    charge_map = chargeMap(film[x_start: range_x[-1] + bact_shape[1], y_start: range_y[-1] + bact_shape[0]],
+                           (bact_shape[1], bact_shape[0]))
 
     # loop all point in the range
-    for x in range_x:
-        for y in range_y:
+    for i, x in enumerate(range_x):
+        for j, y in enumerate(range_y):
             # set the x boundary and y boundary
             x_boundary = bact_shape[1] + x
             y_boundary = bact_shape[0] + y
@@ -229,22 +955,24 @@ def _calculateEnergy(data: Tuple[ndarray, ndarray, ndarray, ndarray], interactTy
             else:
                 raise RuntimeError("Unknown interact type: {}".format(interactType))
 
-            # count and unique
-            unique, counts = np.unique(film_use, return_counts=True)
+            # net charge of this window
+            charge = charge_map[x - x_start, y - y_start]
 
             # record all variables
-            path.append("energy is: {}, unique is: {}, counts is: {}, position is:{}".format(
-                energy, unique, counts, (x, y)))
-
-            # check the calculation result and change corresponding value
-            charge = 0
-            for i in range(len(unique)):
-                if unique[i] == -1:
-                    charge -= counts[i]
-                elif unique[i] == 1:
-                    charge += counts[i]
-                else:
-                    charge += 0
+            if trace is not None:
+                trace[trace_size] = (x, y, energy, charge)
+                trace_size += 1
+
+            if outputMap is not None:
+                outputMap[i, j] = energy
+
+            # keep the lowest positions, compare by energy then x then y
+            if keepNumber > 0:
+                item = (-float(np.round(energy, ENERGY_DECIMALS)), -int(x), -int(y), float(energy), int(charge))
+                if len(lowest) < keepNumber:
+                    heapq.heappush(lowest, item)
+                elif item > lowest[0]:
+                    heapq.heapreplace(lowest, item)
 
             if charge < min_charge:
                 min_charge = charge
@@ -261,59 +989,571 @@ def _calculateEnergy(data: Tuple[ndarray, ndarray, ndarray, ndarray], interactTy
     # save the result
     result = (min_energy, min_x, min_y, min_energy_charge, min_charge, min_charge_x, min_charge_y)
 
-    return (result, min_film, path)
+    # remove the position skipped
+    if trace is not None:
+        trace = trace[:trace_size]
 
+    # sort the lowest positions from the lowest energy
+    lowest = np.array([(-item[1], -item[2], item[3], item[4]) for item in sorted(lowest, reverse=True)],
+                      dtype=TRACE_DTYPE)
 
-def _trans3DTo1D(arrayList: ndarray) -> ndarray:
+    return (result, min_film, trace, lowest)
+
+
+def _calculateEnergyPruned(data: Tuple[ndarray, ndarray, ndarray, ndarray], interactType: str, bacteriaShape: Tuple,
+                           recordTrace: bool = False, keepNumber: int = 0, outputMap: ndarray = None):
     """
-    This helper function take in a 3D ndarray list and transfer to 1D ndarray, divide value by it's height
+    This is the multiprocess helper function for the pruned search, need 2D film and 1D bacteria, only for DOT
+    Positions are calculated from the smallest lower bound of energy given by energyBound, stop when the lower bound
+    is larger than the minimum energy found, or the largest of the lowest keepNumber energy found
+    The result is same as _calculateEnergy, trace and outputMap only have the positions calculated
+    Return the same format as _calculateEnergy and the number of positions pruned
     """
-    # init a indicator for 2D
-    is2D = False
-    visited_size = 0
+    if interactType.upper() != "DOT":
+        raise RuntimeError("Pruned search only support DOT interact type, not {}".format(interactType))
 
-    # if pass in is 2D, using fix height and one layer to make it 3D
-    # init a new array to store info
-    if len(arrayList.shape) == 2:
-        array_2D = np.zeros_like(arrayList)
-        arrayList = [arrayList]
-        is2D = True
+    range_x, range_y, film, bacteria = data
+    kernel_shape = (bacteriaShape[1], bacteriaShape[0])
+    range_x, range_y = scanPosition(film.shape, kernel_shape, range_x, range_y)
+
+    # randomly, just not negative
+    min_energy = float("INF")
+    min_energy_charge = float("INF")
+    min_x = -1
+    min_y = -1
+    min_film = []
+    result = (min_energy, min_x, min_y, min_energy_charge, float("INF"), 0, 0)
+    trace = np.zeros(0, dtype=TRACE_DTYPE) if recordTrace else None
+    lowest = []
+
+    if len(range_x) == 0 or len(range_y) == 0:
+        return result, min_film, trace, np.zeros(0, dtype=TRACE_DTYPE), 0
+
+    # count the +1 and -1 points of every window in this part by integral image
+    x_start = range_x[0]
+    y_start = range_y[0]
+    region = film[x_start: range_x[-1] + kernel_shape[0], y_start: range_y[-1] + kernel_shape[1]]
+    if not np.all(np.isin(region, (-1, 0, 1))):
+        raise RuntimeError("Pruned search need all film points in -1, 0 and 1")
+
+    positive, negative = chargeIntegral(region)
+    positive = boxSum(positive, kernel_shape)[np.ix_(range_x - x_start, range_y - y_start)]
+    negative = boxSum(negative, kernel_shape)[np.ix_(range_x - x_start, range_y - y_start)]
+    charge = positive - negative
+    lower, _ = energyBound(positive, negative, bacteria)
+
+    # minimum charge does not need the energy, smallest x then smallest y when tie
+    min_charge_x, min_charge_y = np.unravel_index(np.argmin(charge), charge.shape)
+    min_charge = int(charge[min_charge_x, min_charge_y])
+    min_charge_x = int(range_x[min_charge_x])
+    min_charge_y = int(range_y[min_charge_y])
+
+    # calculate from the smallest lower bound, the bound has a small floating error for 3D bacteria
+    order = np.argsort(lower, axis=None, kind="stable")
+    lower = np.reshape(lower, (-1,))
+    tolerance = 10 ** -ENERGY_DECIMALS
+
+    if recordTrace:
+        trace = np.zeros(len(order), dtype=TRACE_DTYPE)
+    calculated = 0
+
+    for index in order:
+        # the energy need to beat, positions have same energy as it are still calculated to break the tie
+        if keepNumber > 0:
+            threshold = -lowest[0][0] if len(lowest) == keepNumber else float("INF")
+        else:
+            threshold = min_energy
+        if lower[index] > threshold + tolerance:
+            break
+
+        i, j = divmod(int(index), len(range_y))
+        x = int(range_x[i])
+        y = int(range_y[j])
+
+        film_use = film[x: x + kernel_shape[0], y: y + kernel_shape[1]]
+        energy = np.dot(np.reshape(film_use, (-1,)), bacteria)
+        window_charge = int(charge[i, j])
+
+        if trace is not None:
+            trace[calculated] = (x, y, energy, window_charge)
+        calculated += 1
+
+        if outputMap is not None:
+            outputMap[i, j] = energy
+
+        # keep the lowest positions, compare by energy then x then y
+        if keepNumber > 0:
+            item = (-float(np.round(energy, ENERGY_DECIMALS)), -x, -y, float(energy), window_charge)
+            if len(lowest) < keepNumber:
+                heapq.heappush(lowest, item)
+            elif item > lowest[0]:
+                heapq.heapreplace(lowest, item)
+
+        # positions are not in order, same energy is broken by smaller x then smaller y as _calculateEnergy
+        if energy < min_energy or (energy == min_energy and (x, y) < (min_x, min_y)):
+            min_energy = energy
+            min_x = x
+            min_y = y
+            min_energy_charge = window_charge
+            min_film = film_use
+
+    result = (min_energy, min_x, min_y, min_energy_charge, min_charge, min_charge_x, min_charge_y)
+
+    # sort the trace in order of x then y
+    if trace is not None:
+        trace = trace[:calculated]
+        trace = trace[np.lexsort((trace["y"], trace["x"]))]
+
+    # sort the lowest positions from the lowest energy
+    lowest = np.array([(-item[1], -item[2], item[3], item[4]) for item in sorted(lowest, reverse=True)],
+                      dtype=TRACE_DTYPE)
+
+    return result, min_film, trace, lowest, len(order) - calculated
+
+
+def _calculateEnergySliding(data: Tuple[ndarray, ndarray, ndarray, ndarray], interactType: str, bacteriaShape: Tuple,
+                            recordTrace: bool = False, keepNumber: int = 0, outputMap: ndarray = None):
+    """
+    This is the multiprocess helper function for the sliding window scan, need 2D film and 1D bacteria, only for DOT
+    The energy of the positions in this part is calculated by slidingEnergy, only the part of film is used,
+    so it need much less memory than FFT
+    Return the same format as _calculateEnergy
+    """
+    if interactType.upper() != "DOT":
+        raise RuntimeError("Sliding scan only support DOT interact type, not {}".format(interactType))
+
+    return _calculateEnergyRegion(data, bacteriaShape, slidingEnergy, recordTrace, keepNumber, outputMap)
+
+
+def _calculateEnergyWindow(data: Tuple[ndarray, ndarray, ndarray, ndarray], interactType: str, bacteriaShape: Tuple,
+                           recordTrace: bool = False, keepNumber: int = 0, outputMap: ndarray = None):
+    """
+    This is the multiprocess helper function for the window view scan, need 2D film and 1D bacteria, only for DOT
+    The energy of the positions in this part is calculated by windowViewEnergy, no window is sliced one by one,
+    it is the fast exact scan of small films, where FFT of the whole film does not pay off
+    Return the same format as _calculateEnergy
+    """
+    if interactType.upper() != "DOT":
+        raise RuntimeError("Window view scan only support DOT interact type, not {}".format(interactType))
+
+    return _calculateEnergyRegion(data, bacteriaShape, windowViewEnergy, recordTrace, keepNumber, outputMap)
+
+
+def _calculateEnergyPacked(data: Tuple[ndarray, ndarray, ndarray, ndarray], interactType: str, bacteriaShape: Tuple,
+                           recordTrace: bool = False, keepNumber: int = 0, outputMap: ndarray = None):
+    """
+    This is the multiprocess helper function for the bit plane scan, need 2D film and 1D bacteria, only for DOT
+    The energy of the positions in this part is calculated by packedEnergy, film points need to be in -1, 0 and 1
+    Return the same format as _calculateEnergy
+    """
+    if interactType.upper() != "DOT":
+        raise RuntimeError("Packed scan only support DOT interact type, not {}".format(interactType))
+
+    film = data[2]
+    if not np.all(np.isin(film, (-1, 0, 1))):
+        raise RuntimeError("Packed scan need all film points in -1, 0 and 1")
+
+    return _calculateEnergyRegion(data, bacteriaShape, packedEnergy, recordTrace, keepNumber, outputMap)
+
+
+def _calculateEnergySparse(data: Tuple[ndarray, ndarray, ndarray, ndarray], interactType: str, bacteriaShape: Tuple,
+                           recordTrace: bool = False, keepNumber: int = 0, outputMap: ndarray = None):
+    """
+    This is the multiprocess helper function for the sparse kernel scan, need 2D film and 1D bacteria, only for DOT
+    The energy of the positions in this part is calculated by sparseKernelEnergy, film points need to be integers,
+    they are checked by interact once for the film
+    Return the same format as _calculateEnergy
+    """
+    if interactType.upper() != "DOT":
+        raise RuntimeError("Sparse scan only support DOT interact type, not {}".format(interactType))
+
+    return _calculateEnergyRegion(data, bacteriaShape, sparseKernelEnergy, recordTrace, keepNumber, outputMap)
+
+
+def _calculateEnergySparseFilm(data: Tuple[ndarray, ndarray, SparseFilm, ndarray], interactType: str,
+                               bacteriaShape: Tuple, recordTrace: bool = False, keepNumber: int = 0,
+                               outputMap: ndarray = None):
+    """
+    This is the multiprocess helper function for the sparse film scan, need sparse film and 1D bacteria, only for DOT
+    The energy and charge of the positions in this part are calculated from the domain points under them,
+    the window of film is only made at the minimum energy
+    Return the same format as _calculateEnergy
+    """
+    if interactType.upper() != "DOT":
+        raise RuntimeError("Sparse film scan only support DOT interact type, not {}".format(interactType))
+
+    range_x, range_y, film, bacteria = data
+    kernel = bacteriaKernel(bacteria, bacteriaShape)
+    range_x, range_y = scanPosition(film[0], kernel.shape, range_x, range_y)
+
+    if len(range_x) == 0 or len(range_y) == 0:
+        trace = np.zeros(0, dtype=TRACE_DTYPE) if recordTrace else None
+        return (float("INF"), -1, -1, float("INF"), float("INF"), 0, 0), [], trace, np.zeros(0, dtype=TRACE_DTYPE)
+
+    # energy and charge are index by the index of positions, positions are changed back after
+    energy_map = sparseFilmEnergy(film, kernel, range_x, range_y)
+    charge = sparseFilmCharge(film, kernel.shape, range_x, range_y)
+    index_x = np.arange(len(range_x))
+    index_y = np.arange(len(range_y))
+
+    result = minimumEnergy(energy_map, charge, index_x, index_y)
+    trace = scanTrace(energy_map, charge, index_x, index_y) if recordTrace else None
+    lowest = lowestPosition(energy_map, charge, index_x, index_y, keepNumber)
+
+    if outputMap is not None:
+        outputMap[:len(range_x), :len(range_y)] = energy_map
+
+    # recalculate the minimum energy with np.dot, same floating error as _calculateEnergy
+    min_x = int(range_x[result[1]])
+    min_y = int(range_y[result[2]])
+    min_film = denseFilm(film, min_x, min_x + kernel.shape[0], min_y, min_y + kernel.shape[1])
+    min_energy = np.dot(np.reshape(min_film, (-1,)), bacteria)
+
+    result = (min_energy, min_x, min_y, result[3], result[4], int(range_x[result[5]]), int(range_y[result[6]]))
+    for record in [trace, lowest]:
+        if record is not None:
+            record["x"] = range_x[record["x"]]
+            record["y"] = range_y[record["y"]]
+
+    return result, min_film, trace, lowest
+
+
+def _calculateEnergyRegion(data: Tuple[ndarray, ndarray, ndarray, ndarray], bacteriaShape: Tuple,
+                           regionEnergy: Callable, recordTrace: bool = False, keepNumber: int = 0,
+                           outputMap: ndarray = None):
+    """
+    This function calculate the energy of the positions in this part by regionEnergy(region, kernel, x, y) on the
+    part of film under these positions, the minimum energy is calculated again by np.dot
+    Return the same format as _calculateEnergy
+    """
+    range_x, range_y, film, bacteria = data
+    kernel = bacteriaKernel(bacteria, bacteriaShape)
+    range_x, range_y = scanPosition(film.shape, kernel.shape, range_x, range_y)
+
+    if len(range_x) == 0 or len(range_y) == 0:
+        trace = np.zeros(0, dtype=TRACE_DTYPE) if recordTrace else None
+        return (float("INF"), -1, -1, float("INF"), float("INF"), 0, 0), [], trace, np.zeros(0, dtype=TRACE_DTYPE)
+
+    # only the film under this part is used, positions are moved into it
+    x_start = range_x[0]
+    y_start = range_y[0]
+    region = film[x_start: range_x[-1] + kernel.shape[0], y_start: range_y[-1] + kernel.shape[1]]
+    local_x = range_x - x_start
+    local_y = range_y - y_start
+
+    # energy and charge of the positions in this part, the part of film may not be square, so no scanPosition on it
+    energy_map = np.zeros((region.shape[0] - kernel.shape[0] + 1, region.shape[1] - kernel.shape[1] + 1))
+    energy_map[np.ix_(local_x, local_y)] = regionEnergy(region, kernel, local_x, local_y)
+    charge = chargeMap(region, kernel.shape)
+
+    result = minimumEnergy(energy_map, charge, local_x, local_y)
+    trace = scanTrace(energy_map, charge, local_x, local_y) if recordTrace else None
+    lowest = lowestPosition(energy_map, charge, local_x, local_y, keepNumber)
+
+    if outputMap is not None:
+        outputMap[:len(range_x), :len(range_y)] = energy_map[np.ix_(local_x, local_y)]
+
+    # recalculate the minimum energy with np.dot, same floating error as _calculateEnergy
+    min_x = int(result[1] + x_start)
+    min_y = int(result[2] + y_start)
+    min_film = film[min_x: min_x + kernel.shape[0], min_y: min_y + kernel.shape[1]]
+    min_energy = np.dot(np.reshape(min_film, (-1,)), bacteria)
+
+    # move the positions from the part to the whole film
+    result = (min_energy, min_x, min_y, result[3], result[4], int(result[5] + x_start), int(result[6] + y_start))
+    for record in [trace, lowest]:
+        if record is not None:
+            record["x"] += x_start
+            record["y"] += y_start
+
+    return result, min_film, trace, lowest
+
+
+def _calculateEnergyShared(data: Tuple[ndarray, ndarray, SharedDescriptor, SharedDescriptor, Tuple[int, int]],
+                           interactType: str, bacteriaShape: Tuple, cutoff: int = None, recordTrace: bool = False,
+                           keepNumber: int = 0, energyMapPath: str = None, engine: str = "DIRECT"):
+    """
+    This is the multiprocess helper function attach film and bacteria from shared memory, then call _calculateEnergy,
+    or _calculateEnergyPruned if engine is "PRUNED", or _calculateEnergySliding if engine is "SLIDING",
+    or _calculateEnergyWindow if engine is "WINDOW", or _calculateEnergyPacked if engine is "PACKED",
+    or _calculateEnergySparse if engine is "SPARSE", or _calculateEnergySparseFilm if engine is "SPARSE_FILM",
+    then film_descriptor is the sparse film of this part
+    The film stays attached in this worker for the next scan, bacteria is closed after this part
+    If energyMapPath is given, open the energy map file and write the block of this part, start at the index in data
+    Return the result of this part and the number of positions pruned
+    """
+    range_x, range_y, film_descriptor, bacteria_descriptor, block = data
+
+    # attach to the shared film and bacteria, no copy is made, sparse film is carried by the task
+    film = film_descriptor if engine == "SPARSE_FILM" else attachFilm(film_descriptor)
+    bacteria_shared, bacteria = attachArray(bacteria_descriptor)
+
+    # only this part of the energy map is written by this process
+    energy_map = None
+    output_map = None
+    if energyMapPath is not None:
+        energy_map = np.load(energyMapPath, mmap_mode="r+")
+        output_map = energy_map[block[0]: block[0] + len(range_x), block[1]: block[1] + len(range_y)]
+
+    try:
+        pruned = 0
+        if engine == "PRUNED":
+            result, min_film, trace, lowest, pruned = _calculateEnergyPruned((range_x, range_y, film, bacteria),
+                                                                             interactType, bacteriaShape, recordTrace,
+                                                                             keepNumber, output_map)
+        elif engine == "SLIDING":
+            result, min_film, trace, lowest = _calculateEnergySliding((range_x, range_y, film, bacteria),
+                                                                      interactType, bacteriaShape, recordTrace,
+                                                                      keepNumber, output_map)
+        elif engine == "WINDOW":
+            result, min_film, trace, lowest = _calculateEnergyWindow((range_x, range_y, film, bacteria),
+                                                                     interactType, bacteriaShape, recordTrace,
+                                                                     keepNumber, output_map)
+        elif engine == "PACKED":
+            result, min_film, trace, lowest = _calculateEnergyPacked((range_x, range_y, film, bacteria),
+                                                                     interactType, bacteriaShape, recordTrace,
+                                                                     keepNumber, output_map)
+        elif engine == "SPARSE":
+            result, min_film, trace, lowest = _calculateEnergySparse((range_x, range_y, film, bacteria),
+                                                                     interactType, bacteriaShape, recordTrace,
+                                                                     keepNumber, output_map)
+        elif engine == "SPARSE_FILM":
+            result, min_film, trace, lowest = _calculateEnergySparseFilm((range_x, range_y, film, bacteria),
+                                                                         interactType, bacteriaShape, recordTrace,
+                                                                         keepNumber, output_map)
+        else:
+            result, min_film, trace, lowest = _calculateEnergy((range_x, range_y, film, bacteria), interactType,
+                                                               bacteriaShape, cutoff, recordTrace, keepNumber,
+                                                               output_map)
+
+        # min_film is a view of shared memory, copy it before close
+        min_film = np.array(min_film)
+    finally:
+        # drop all views before close the shared memory
+        del film, bacteria
+        bacteria_shared.close()
+
+        if energy_map is not None:
+            energy_map.flush()
+
+    return result, min_film, trace, lowest, pruned
+
+
+def _calculateEnergyTile(tile: Tuple[ndarray, ndarray, Tuple[int, int]], filmPath: str, kernel: ndarray,
+                         keepNumber: int = 0, tracePath: str = None, scanShape: Tuple[int, int] = None,
+                         energyMapPath: str = None):
+    """
+    This is the multiprocess helper function open the film file and scan one tile
+    If energyMapPath is given, open the energy map file and write the block of this tile
+    If tracePath is given, open the trace file of all scanShape positions and write the block of this tile
+    """
+    tile_x, tile_y, block = tile
+
+    film = openFilm(filmPath)
+    result, energy, trace, lowest = tileEnergy(film, kernel, tile_x, tile_y, keepNumber, tracePath is not None)
+
+    if energyMapPath is not None:
+        energy_map = np.load(energyMapPath, mmap_mode="r+")
+        energy_map[block[0]: block[0] + len(tile_x), block[1]: block[1] + len(tile_y)] = energy
+        energy_map.flush()
+
+    # trace of the tile is in order of x then y, same as its block in the trace of all positions
+    if tracePath is not None:
+        scan_trace = np.reshape(np.load(tracePath, mmap_mode="r+"), scanShape)
+        scan_trace[block[0]: block[0] + len(tile_x), block[1]: block[1] + len(tile_y)] = \
+            np.reshape(trace, (len(tile_x), len(tile_y)))
+        scan_trace.flush()
+
+    return result, lowest
+
+
+def _calculateEnergyFFT(film: ndarray, bacteria: ndarray, bacteriaShape: Tuple, range_x: ndarray, range_y: ndarray,
+                        interactType: str, cutoff: int = None, recordTrace: bool = False, keepNumber: int = 0,
+                        outputMap: ndarray = None):
+    """
+    This function calculate the energy of all positions by FFT, need 2D film and 1D bacteria
+    CUTOFF energy is the moving average of DOT energy over the cutoff range, same as _getCutoffFilm1D
+    Return the same format as _calculateEnergy
+    """
+    # change bacteria into the kernel
+    kernel = bacteriaKernel(bacteria, bacteriaShape)
+
+    # calculate DOT energy and charge at every position, the film spectrum and integral images can be read from cache
+    shape = fftShape(film.shape)
+    mapShape = (film.shape[0] - kernel.shape[0] + 1, film.shape[1] - kernel.shape[1] + 1)
+    energyMap = correlateSpectrum(cachedSpectrum(film, shape), kernelSpectrum(kernel, shape), shape, mapShape)
+    charge = cachedChargeMap(film, kernel.shape)
+
+    return _reduceEnergyMap(film, bacteria, bacteriaShape, energyMap, charge, range_x, range_y, interactType, cutoff,
+                            recordTrace, keepNumber, outputMap)
+
+
+def _reduceEnergyMap(film: ndarray, bacteria: ndarray, bacteriaShape: Tuple, energyMap: ndarray, charge: ndarray,
+                     range_x: ndarray, range_y: ndarray, interactType: str, cutoff: int = None,
+                     recordTrace: bool = False, keepNumber: int = 0, outputMap: ndarray = None):
+    """
+    This function take in the DOT energy map and charge map of all positions, find the minimum on the positions scanned
+    Return the same format as _calculateEnergy
+    """
+    # remove the position exceed the film
+    kernelShape = (bacteriaShape[1], bacteriaShape[0])
+    range_x, range_y = scanPosition(film.shape, kernelShape, range_x, range_y)
+
+    # CUTOFF energy is calculated from DOT energy
+    if interactType.upper() in ["CUTOFF", "CUT-OFF"]:
+        # _getCutoffFilm1D use square window, so only square bacteria works
+        if kernelShape[0] != kernelShape[1]:
+            raise RuntimeError("CUTOFF interact only support square bacteria, bacteria shape is: {}".format(
+                bacteriaShape))
+
+        # window in _getCutoffFilm1D start at film[y_s, x_s], so the map need to transpose
+        upper = (film.shape[0] - 1 - bacteriaShape[0], film.shape[1] - 1 - bacteriaShape[1])
+        energyMap = cutoffEnergyMap(energyMap, cutoff, upper).T
+
+    elif interactType.upper() != "DOT":
+        raise RuntimeError("Unknown interact type: {}".format(interactType))
+
+    # keep the position scanned
+    result = minimumEnergy(energyMap, charge, range_x, range_y)
+    trace = scanTrace(energyMap, charge, range_x, range_y) if recordTrace else None
+    lowest = lowestPosition(energyMap, charge, range_x, range_y, keepNumber)
+
+    # positions exceed the film are at the end of the range, they stay NaN
+    if outputMap is not None:
+        outputMap[:len(range_x), :len(range_y)] = energyMap[np.ix_(range_x, range_y)]
+
+    min_x, min_y = result[1], result[2]
+    if min_x < 0:
+        return result, [], trace, lowest
+
+    # recalculate the minimum energy with np.dot, remove the floating error of FFT
+    min_film = film[min_x: min_x + kernelShape[0], min_y: min_y + kernelShape[1]]
+    if interactType.upper() == "DOT":
+        min_energy = np.dot(np.reshape(min_film, (-1,)), bacteria)
     else:
-        array_2D = np.zeros(arrayList.shape[1:])
+        energy_list = [np.dot(film_1D, bacteria) for film_1D in
+                       _getCutoffFilm1D(film, (min_x, min_y), bacteriaShape, cutoff)]
+        min_energy = sum(energy_list) / len(energy_list)
+    result = (min_energy,) + result[1:]
 
-    # loop whole array
-    for z in range(len(arrayList)):
-        for y in range(len(arrayList[z])):
-            for x in range(len(arrayList[z][y])):
-                # check if this (x, y) has been visited, if visited, pass
-                new_value = array_2D[y][x]
+    return result, min_film, trace, lowest
 
-                # get current value
-                value = arrayList[z][y][x]
 
-                # if new_value is not 0, means it has visited
-                # if value is 2 means empty, do not save
-                if new_value != 0 or value == 2:
-                    continue
+def _calculateEnergyPyramid(film: ndarray, bacteria: ndarray, bacteriaShape: Tuple, range_x: ndarray,
+                            range_y: ndarray, interactType: str, candidate: int = PYRAMID_CANDIDATE,
+                            recordTrace: bool = False, keepNumber: int = 0, outputMap: ndarray = None,
+                            check: bool = False):
+    """
+    This function search the minimum energy by coarse to fine search on the film pyramid, need 2D film and 1D bacteria
+    Only the positions near the candidates are calculated exactly, return the same format as _calculateEnergy
+    The lowest positions and outputMap only contain the positions calculated at full resolution
+    If check, the minimum is also compared with the exhaustive search, the agreement of all scans checked is shown
+    """
+    if interactType.upper() != "DOT":
+        raise RuntimeError("PYRAMID engine only support DOT interact, interact type is: {}".format(interactType))
+
+    # change bacteria into the kernel and remove the position exceed the film
+    kernel = bacteriaKernel(bacteria, bacteriaShape)
+    range_x, range_y = scanPosition(film.shape, kernel.shape, range_x, range_y)
+
+    energy, position_x, position_y, evaluation = pyramidSearch(film, kernel, range_x, range_y, candidate)
+    showMessage("Pyramid search evaluated {} positions, exhaustive search need {} positions".format(
+        evaluation, len(range_x) * len(range_y)))
+
+    # charge is cheap, calculate at every position
+    charge = cachedChargeMap(film, kernel.shape)
+
+    # pyramid search may miss the global minimum, report how often it agrees with the exhaustive search
+    if check:
+        agree = checkPyramid(film, kernel, range_x, range_y, charge, energy)
+        showMessage("Pyramid search {} the exhaustive search, {} of {} scans checked find the same minimum".format(
+            "agrees with" if agree else "misses the minimum of", PYRAMID_AGREEMENT[1], PYRAMID_AGREEMENT[0]))
+
+    # record the positions calculated at full resolution
+    calculated = np.zeros(len(energy), dtype=TRACE_DTYPE)
+    calculated["x"] = position_x
+    calculated["y"] = position_y
+    calculated["energy"] = energy
+    calculated["charge"] = charge[position_x, position_y]
+    trace = calculated if recordTrace else None
+
+    if outputMap is not None:
+        outputMap[np.searchsorted(range_x, position_x), np.searchsorted(range_y, position_y)] = energy
+
+    if len(energy) == 0:
+        return (float("INF"), -1, -1, float("INF"), float("INF"), 0, 0), [], trace, calculated
+
+    # minimum energy, tie broken by smaller x then smaller y
+    calculated = sortPosition(calculated)
+    min_x = int(calculated[0]["x"])
+    min_y = int(calculated[0]["y"])
+
+    result = (calculated[0]["energy"], min_x, min_y, int(calculated[0]["charge"])) + \
+        minimumCharge(charge, range_x, range_y)
+    min_film = film[min_x: min_x + kernel.shape[0], min_y: min_y + kernel.shape[1]]
+
+    return result, min_film, trace, calculated[:keepNumber]
+
+
+def _saveMinimum(lowestList: List[ndarray], topK: int, minSeparation: int, fileName: str) -> None:
+    """
+    This helper function merge the lowest positions of all parts, save the topK minima separated by minSeparation
+    Nothing is saved if topK is not larger than 1, the minimum is already in the result
+    """
+    if topK <= 1:
+        return None
+
+    minimum = separatedMinimum(lowestList, topK, minSeparation)
+    writeLog("Lowest {} positions separated by {} are: {}".format(topK, minSeparation, minimum))
+    saveTrace(minimum, fileName)
+
+
+def _trans3DTo1D(arrayList: ndarray, energyModel: str = "CONTACT", screeningLength: float = SCREENING_LENGTH) \
+        -> ndarray:
+    """
+    This helper function take in a 3D ndarray list and transfer to 1D ndarray, divide value by it's height
+    Value of each (y, x) comes from the first layer not empty (value is not 2), height of layer z is z + 1
+    If energyModel is not "CONTACT", every layer not empty is used with the weight from layerWeight
+    If pass in is 2D, using fix height and one layer
+    """
+    if len(arrayList.shape) == 2:
+        return np.reshape(np.where(arrayList == 2, 0, arrayList / FIX_2D_HEIGHT), (-1,))
 
-                # calculate new value
-                if is2D:
-                    height = FIX_2D_HEIGHT
-                else:
-                    # +1 to avoid divide 0
-                    height = z + 1
+    if energyModel.upper() != "CONTACT":
+        # every layer is correlated with the same film, so the sum of the energy of all layers is the energy of one
+        # layer, which is the sum of layers weighted by distance, empty is 0
+        weight = layerWeight(arrayList.shape[0], energyModel, screeningLength)
+        return np.reshape(np.tensordot(weight, np.where(arrayList == 2, 0, arrayList), axes=1), (-1,))
 
-                # change value
-                array_2D[y][x] = value / height
-                visited_size += 1
+    layer = _contactLayer(arrayList == 2)
 
-                if visited_size == arrayList.size:
-                    return np.reshape(array_2D, (-1,))
+    # gather the value at the contact layer, (y, x) without any surface is 0
+    contact = np.maximum(layer, 0)
+    value = np.take_along_axis(arrayList, contact[np.newaxis], axis=0)[0]
+    array_2D = np.where(layer >= 0, value / (contact + 1), 0)
 
     # return a 1D array
     return np.reshape(array_2D, (-1,))
 
 
+def _contactLayer(empty: ndarray) -> ndarray:
+    """
+    This helper function return the index of the first layer not empty for each (y, x), -1 if all layers are empty
+    The index is cached for each shape, all bacteria with the same shape and size only need a gather
+    """
+    cached = CONTACT_LAYER.get(empty.shape)
+    if cached is not None and np.array_equal(cached[0], empty):
+        return cached[1]
+
+    # argmax return the first True along z
+    layer = np.argmax(~empty, axis=0)
+    layer[np.all(empty, axis=0)] = -1
+
+    CONTACT_LAYER[empty.shape] = (empty, layer)
+
+    return layer
+
+
 def _getCutoffFilm1D(film: ndarray, startPoint: Tuple[int, int], bacteriaSize: Tuple[int, int], cutoff: int) \
         -> List[ndarray]:
     """
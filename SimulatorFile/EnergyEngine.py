@@ -0,0 +1,620 @@
+"""
+This program:
+- Calculates the energy of bacteria at every position on the film in one pass
+- Reduces the energy map into the result format used by the energy scan simulator
+- Picks the lowest energy positions separated by a minimum distance
+"""
+import heapq
+from typing import Tuple, Union, List
+
+import numpy as np
+from numpy import ndarray
+from numpy.lib.stride_tricks import sliding_window_view
+
+# number of decimals kept when compare energy from the transform, remove the floating error of FFT
+ENERGY_DECIMALS = 6
+
+# format of the record array saves the energy and charge of every position scanned
+TRACE_DTYPE = np.dtype([("x", np.int64), ("y", np.int64), ("energy", np.float64), ("charge", np.int64)])
+
+# memory can be used by one batch of bacteria in batched scan, in bytes
+BATCH_MEMORY_LIMIT = 2 * 1024 ** 3
+
+# energy model of 3D bacteria, "CONTACT" only use the first layer not empty above each film point,
+# "COULOMB" and "SCREENED" use every layer weighted by its distance to the film
+ENERGY_MODEL = ("CONTACT", "COULOMB", "SCREENED")
+
+# screening length of "SCREENED" energy model, in number of layers
+SCREENING_LENGTH = 10.0
+
+# memory can be used by the packed words of one block of windows in packed scan, in bytes
+PACKED_BLOCK_MEMORY = 64 * 1024 ** 2
+
+# film read by one block of windows in window view scan, in bytes, about the L2 cache of one core
+WINDOW_BLOCK_MEMORY = 1024 ** 2
+
+# number of bits set in every byte, count bits when numpy has no np.bitwise_count
+BYTE_BIT_COUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# orientations of the bacteria kernel, (number of 90 degree counterclockwise rotations, mirror left to right first)
+# the first orientationNumber of them are scanned, so 2 keeps the shape of kernel, 4 are all rotations, 8 add mirrors
+ORIENTATION = ((0, False), (2, False), (1, False), (3, False), (0, True), (2, True), (1, True), (3, True))
+
+
+def layerWeight(layerNumber: int, energyModel: str, screeningLength: float = SCREENING_LENGTH) -> ndarray:
+    """
+    This function return the weight of each layer of 3D bacteria, layer z is at distance r = z + 1 above the film
+    "COULOMB" weight is 1 / r, "SCREENED" weight is exp(-(r - 1) / screeningLength) / r, both are 1 at layer 0
+    """
+    distance = np.arange(1, layerNumber + 1, dtype=float)
+
+    if energyModel.upper() == "COULOMB":
+        return 1 / distance
+    elif energyModel.upper() == "SCREENED":
+        if screeningLength <= 0:
+            raise RuntimeError("Screening length need to be positive, screening length is: {}".format(
+                screeningLength))
+        return np.exp(-(distance - 1) / screeningLength) / distance
+    else:
+        raise RuntimeError("Unknown energy model: {}".format(energyModel))
+
+
+def bacteriaKernel(bacteria: ndarray, bacteriaShape: Tuple) -> ndarray:
+    """
+    This function reshape the 1D bacteria into a 2D kernel
+    The kernel matches the film window film[x: x + bacteriaShape[1], y: y + bacteriaShape[0]] in _calculateEnergy
+    """
+    return np.reshape(bacteria, (bacteriaShape[1], bacteriaShape[0]))
+
+
+def scanPosition(filmShape: Tuple[int, int], kernelShape: Tuple[int, int], rangeX: ndarray, rangeY: ndarray) \
+        -> Tuple[ndarray, ndarray]:
+    """
+    This function remove the scan positions where bacteria exceed the range of film surface
+    Same check as _calculateEnergy, also make sure the window on the film is complete
+    """
+    rangeX = np.asarray(rangeX)
+    rangeY = np.asarray(rangeY)
+
+    # x is the first axis of window, y is the second axis of window
+    validX = (rangeX + kernelShape[0] <= filmShape[1]) & (rangeX + kernelShape[0] <= filmShape[0])
+    validY = (rangeY + kernelShape[1] <= filmShape[0]) & (rangeY + kernelShape[1] <= filmShape[1])
+
+    return rangeX[validX], rangeY[validY]
+
+
+def orientKernel(kernel: ndarray, orientation: int) -> ndarray:
+    """
+    This function return the kernel rotated and mirrored as ORIENTATION[orientation]
+    """
+    rotation, mirror = ORIENTATION[orientation]
+    if mirror:
+        kernel = np.fliplr(kernel)
+
+    return np.ascontiguousarray(np.rot90(kernel, rotation))
+
+
+def orientationName(orientation: int) -> str:
+    """
+    This function return the readable name of ORIENTATION[orientation]
+    """
+    rotation, mirror = ORIENTATION[orientation]
+
+    return "{}rotate {}".format("mirror, " if mirror else "", 90 * rotation)
+
+
+def fftShape(filmShape: Tuple[int, int]) -> Tuple[int, int]:
+    """
+    This function return the shape of transform for the film
+    Correlation is circular, but the window never wrap when start inside the valid range, so no pad is needed
+    """
+    return _nextFastLength(filmShape[0]), _nextFastLength(filmShape[1])
+
+
+def filmSpectrum(film: ndarray, shape: Tuple[int, int]) -> ndarray:
+    """
+    This function calculate the spectrum of the film, can be reused for all bacteria scan this film
+    """
+    return np.fft.rfft2(film, shape)
+
+
+def kernelSpectrum(kernel: ndarray, shape: Tuple[int, int]) -> ndarray:
+    """
+    This function calculate the conjugate spectrum of the kernel, product with film spectrum gives correlation
+    """
+    return np.conj(np.fft.rfft2(kernel, shape))
+
+
+def correlateSpectrum(filmFFT: ndarray, kernelFFT: ndarray, shape: Tuple[int, int],
+                      mapShape: Tuple[int, int]) -> ndarray:
+    """
+    This function take in the film spectrum and the kernel spectrum, return the energy map
+    energy_map[x, y] is the energy of the window start at (x, y)
+    kernelFFT can be a batch of kernel spectrum in shape (batch, ...), then return a batch of energy map
+    """
+    energy = np.fft.irfft2(filmFFT * kernelFFT, shape)
+
+    return energy[..., :mapShape[0], :mapShape[1]]
+
+
+def fftEnergyMap(film: ndarray, kernel: ndarray) -> ndarray:
+    """
+    This function calculate energy of the kernel at every position on the film by FFT cross correlation
+    Energy at (x, y) is sum(film[x: x + kernel.shape[0], y: y + kernel.shape[1]] * kernel)
+    """
+    shape = fftShape(film.shape)
+    mapShape = (film.shape[0] - kernel.shape[0] + 1, film.shape[1] - kernel.shape[1] + 1)
+
+    return correlateSpectrum(filmSpectrum(film, shape), kernelSpectrum(kernel, shape), shape, mapShape)
+
+
+def slidingEnergy(film: ndarray, kernel: ndarray, rangeX: ndarray, rangeY: ndarray) -> ndarray:
+    """
+    This function calculate the energy of the windows at rangeX and rangeY row by row, positions need to be valid
+    For each row, every bacteria column is correlated with every film column of the strip in one matrix product,
+    the energy of a window is the sum of the width column correlations on its diagonal, no window is copied
+    Neighbour windows share the column correlations, but each pairs bacteria column b with a different film column,
+    so there is no running sum along the row, a row costs height * width * strip width and a position costs width
+    Memory used is about bacteria width times film width, need small interval on y to share the columns
+    Return the energy of the positions, index by the index in rangeX and rangeY
+    """
+    height, width = kernel.shape
+    energy = np.zeros((len(rangeX), len(rangeY)))
+    if len(rangeX) == 0 or len(rangeY) == 0:
+        return energy
+
+    # columns of the film used by the positions on one row
+    y_start = rangeY[0]
+    y_end = rangeY[-1] + width
+    localY = rangeY - y_start
+
+    for i, x in enumerate(rangeX):
+        # column[b, c] is the correlation of bacteria column b and film column c of the strip
+        column = kernel.T @ film[x: x + height, y_start: y_end]
+
+        for b in range(width):
+            energy[i] += column[b, localY + b]
+
+    return energy
+
+
+def windowViewEnergy(film: ndarray, kernel: ndarray, rangeX: ndarray, rangeY: ndarray) -> ndarray:
+    """
+    This function calculate the energy of the windows at rangeX and rangeY on the window view of film, positions need
+    to be valid
+    The view has every window of the film as a 2D array without copy, the windows of a block of rows are
+    multiplied with the kernel in one einsum, the rows of film read by one block fit in WINDOW_BLOCK_MEMORY
+    Positions with the same interval are sliced from the view, otherwise the windows of a block are copied out
+    Return the energy of the positions, index by the index in rangeX and rangeY
+    """
+    height, width = kernel.shape
+    energy = np.zeros((len(rangeX), len(rangeY)))
+    if len(rangeX) == 0 or len(rangeY) == 0:
+        return energy
+
+    # view[x, y] is the window start at (x, y)
+    view = sliding_window_view(film, kernel.shape)
+    stepX, stepY = _uniformStep(rangeX), _uniformStep(rangeY)
+
+    # rows of windows in one block, the rows of film under them fit in the block memory
+    rowBytes = (rangeY[-1] - rangeY[0] + width) * film.itemsize
+    blockSize = max(1, (WINDOW_BLOCK_MEMORY // rowBytes - height) // max(stepX, 1) + 1)
+
+    for start in range(0, len(rangeX), blockSize):
+        blockX = rangeX[start: start + blockSize]
+        if stepX > 0 and stepY > 0:
+            windows = view[blockX[0]: blockX[-1] + 1: stepX, rangeY[0]: rangeY[-1] + 1: stepY]
+        else:
+            windows = view[blockX[:, np.newaxis], rangeY]
+
+        energy[start: start + len(blockX)] = np.einsum("xyij,ij->xy", windows, kernel)
+
+    return energy
+
+
+def packRow(mask: ndarray, shift: int = 0, wordNumber: int = None) -> ndarray:
+    """
+    This function pack every row of the bool mask into uint64 words, point y of the row is bit (y + shift) % 64 of
+    word (y + shift) // 64, the row is padded with 0 to wordNumber words
+    """
+    if wordNumber is None:
+        wordNumber = (mask.shape[1] + shift + 63) // 64
+
+    padded = np.zeros((mask.shape[0], wordNumber * 64), dtype=bool)
+    padded[:, shift: shift + mask.shape[1]] = mask
+
+    return np.packbits(padded, axis=1, bitorder="little").view("<u8")
+
+
+def packKernel(kernel: ndarray) -> Tuple[ndarray, ndarray]:
+    """
+    This function split the kernel into one bit plane for each value not 0, each plane is packed at all 64 shifts
+    Return the values and the planes in shape (value, shift, kernel height, word)
+    """
+    values = np.unique(kernel[kernel != 0])
+    wordNumber = (kernel.shape[1] + 63 + 63) // 64
+
+    planes = np.zeros((len(values), 64, kernel.shape[0], wordNumber), dtype="<u8")
+    for i, value in enumerate(values):
+        for shift in range(64):
+            planes[i, shift] = packRow(kernel == value, shift, wordNumber)
+
+    return values, planes
+
+
+def popCount(words: ndarray) -> ndarray:
+    """
+    This function return the number of bits set in every uint64 word
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+
+    return BYTE_BIT_COUNT[words.view(np.uint8)].reshape(words.shape + (8,)).sum(axis=-1)
+
+
+def packedEnergy(film: ndarray, kernel: ndarray, rangeX: ndarray, rangeY: ndarray) -> ndarray:
+    """
+    This function calculate the energy of the windows at rangeX and rangeY on bit planes, positions need to be valid
+    Film points need to be in {-1, 0, 1}, the +1 and -1 points are packed into 64 bits words, so the energy of each
+    value of kernel is the number of bits set in (+1 plane & kernel plane) minus in (-1 plane & kernel plane)
+    Time used is about number of kernel values / 64 of the direct calculation, plus the cost of gathering words
+    Return the energy of the positions, index by the index in rangeX and rangeY
+    """
+    height = kernel.shape[0]
+    energy = np.zeros((len(rangeX), len(rangeY)))
+    if len(rangeX) == 0 or len(rangeY) == 0:
+        return energy
+
+    values, planes = packKernel(kernel)
+    wordNumber = planes.shape[-1]
+
+    # pad words so the window on the last column still has wordNumber words
+    filmPositive = packRow(film == 1, 0, (film.shape[1] + 63) // 64 + wordNumber)
+    filmNegative = packRow(film == -1, 0, (film.shape[1] + 63) // 64 + wordNumber)
+
+    # the window at y starts at bit y % 64 of word y // 64, with the kernel planes packed at this shift
+    index = (rangeY // 64)[:, np.newaxis] + np.arange(wordNumber)
+    planes = planes[:, rangeY % 64]
+
+    # rows of windows calculated together, words of these windows use at most PACKED_BLOCK_MEMORY bytes
+    blockSize = max(1, PACKED_BLOCK_MEMORY // (len(rangeY) * wordNumber * 8))
+    for start in range(0, len(rangeX), blockSize):
+        blockX = rangeX[start: start + blockSize]
+
+        # add the energy of one kernel row at a time, words in shape (window x, window y, word)
+        for row in range(height):
+            positive = filmPositive[blockX + row][:, index]
+            negative = filmNegative[blockX + row][:, index]
+
+            for value, plane in zip(values, planes[:, :, row]):
+                count = popCount(positive & plane).sum(axis=2, dtype=np.int64) - \
+                    popCount(negative & plane).sum(axis=2, dtype=np.int64)
+                energy[start: start + len(blockX)] += value * count
+
+    return energy
+
+
+def kernelDomain(kernel: ndarray) -> Tuple[float, ndarray, ndarray, ndarray]:
+    """
+    This function split the kernel into a uniform surface charge and the domain points differ from it
+    The surface charge is the most common value of kernel
+    Return the surface charge, x and y of the domain points, and their value minus the surface charge
+    """
+    values, counts = np.unique(kernel, return_counts=True)
+    background = values[np.argmax(counts)]
+    cellX, cellY = np.nonzero(kernel != background)
+
+    return background, cellX, cellY, kernel[cellX, cellY] - background
+
+
+def filmValue(film: ndarray) -> Tuple[bool, bool]:
+    """
+    This function return the film points are all integers or not, and all in -1, 0 and 1 or not
+    """
+    ternary = bool(np.all(np.isin(film, (-1, 0, 1))))
+
+    return ternary or bool(np.all(np.mod(film, 1) == 0)), ternary
+
+
+def sparseKernelEnergy(film: ndarray, kernel: ndarray, rangeX: ndarray, rangeY: ndarray) -> ndarray:
+    """
+    This function calculate the energy of the windows at rangeX and rangeY, positions need to be valid
+    The energy is the surface charge of kernel times the sum of film in the window, from the integral image,
+    plus the difference of each domain point times the film point under it, film points need to be integers
+    Time used is about number of domain points of kernel, not the area of kernel
+    Return the energy of the positions, index by the index in rangeX and rangeY
+    """
+    background, cellX, cellY, difference = kernelDomain(kernel)
+
+    energy = background * boxSum(integralImage(film), kernel.shape)[np.ix_(rangeX, rangeY)]
+    if len(rangeX) == 0 or len(rangeY) == 0:
+        return energy
+
+    # positions on the interval are taken by slices, which is much faster than index arrays
+    stepX = _uniformStep(rangeX)
+    stepY = _uniformStep(rangeY)
+    for x, y, value in zip(cellX, cellY, difference):
+        if stepX and stepY:
+            energy += value * film[rangeX[0] + x: rangeX[-1] + x + 1: stepX, rangeY[0] + y: rangeY[-1] + y + 1: stepY]
+        else:
+            energy += value * film[np.ix_(rangeX + x, rangeY + y)]
+
+    return energy
+
+
+def batchSize(shape: Tuple[int, int], memoryLimit: int = BATCH_MEMORY_LIMIT) -> int:
+    """
+    This function calculate how many kernels can be correlated with the film at the same time under the memory limit
+    Each kernel need its spectrum, the product with film spectrum and the energy map
+    """
+    spectrumBytes = shape[0] * (shape[1] // 2 + 1) * 16
+    mapBytes = shape[0] * shape[1] * 8
+
+    return max(1, int(memoryLimit // (2 * spectrumBytes + mapBytes)))
+
+
+def integralImage(surface: ndarray) -> ndarray:
+    """
+    This function calculate the summed area table of the surface
+    A zero row and column is added in front, so the sum of any window is four lookups
+    """
+    integral = np.zeros((surface.shape[0] + 1, surface.shape[1] + 1), dtype=np.int64)
+    np.cumsum(np.cumsum(surface, axis=0, dtype=np.int64), axis=1, out=integral[1:, 1:])
+
+    return integral
+
+
+def chargeIntegral(film: ndarray) -> Tuple[ndarray, ndarray]:
+    """
+    This function calculate the integral image of positive points and negative points on the film
+    """
+    return integralImage(film == 1), integralImage(film == -1)
+
+
+def windowSum(integral: ndarray, x: int, y: int, kernelShape: Tuple[int, int]) -> int:
+    """
+    This function return the sum of the window start at (x, y) with four lookups in the integral image
+    """
+    x_boundary = x + kernelShape[0]
+    y_boundary = y + kernelShape[1]
+
+    return integral[x_boundary, y_boundary] - integral[x, y_boundary] - integral[x_boundary, y] + integral[x, y]
+
+
+def boxSum(integral: ndarray, kernelShape: Tuple[int, int]) -> ndarray:
+    """
+    This function return the sum of every window on the surface in one vectorized step
+    boxSum(integral, kernelShape)[x, y] is same as windowSum(integral, x, y, kernelShape)
+    """
+    height, width = kernelShape
+
+    return integral[height:, width:] - integral[:-height, width:] - integral[height:, :-width] + \
+        integral[:-height, :-width]
+
+
+def chargeMap(film: ndarray, kernelShape: Tuple[int, int]) -> ndarray:
+    """
+    This function calculate net charge (number of +1 minus number of -1) of every window on the film
+    """
+    positive, negative = chargeIntegral(film)
+
+    return boxSum(positive, kernelShape) - boxSum(negative, kernelShape)
+
+
+def energyBound(positive: ndarray, negative: ndarray, bacteria: ndarray) -> Tuple[ndarray, ndarray]:
+    """
+    This function calculate the lower and upper bound of the energy of windows from the number of +1 and -1 points
+    in each window, only true when film points are in {-1, 0, 1}, bacteria can have any value
+    Lower bound puts the +1 points on the smallest bacteria values and the -1 points on the largest, upper bound is
+    the opposite, the two groups never overlap because a window has no more points than the bacteria
+    """
+    ascend = np.concatenate(([0], np.cumsum(np.sort(bacteria))))
+    descend = np.concatenate(([0], np.cumsum(np.sort(bacteria)[::-1])))
+
+    return ascend[positive] - descend[negative], descend[positive] - ascend[negative]
+
+
+def cutoffEnergyMap(energyMap: ndarray, cutoff: int, upper: Tuple[int, int]) -> ndarray:
+    """
+    This function calculate the CUTOFF energy from the DOT energy map with a moving average filter
+    Value at [r, c] is the mean of energyMap over rows [r - cutoff, r + cutoff] and columns [c - cutoff, c + cutoff],
+    the neighbourhood is clipped to [0, upper[0]] and [0, upper[1]], same as _getCutoffFilm1D
+    Cost does not depend on the cutoff, position without any neighbour gets INF energy
+    """
+    # moving sum along rows, then along columns
+    energy, rowCount = _movingSum(energyMap, cutoff, upper[0], 0)
+    energy, columnCount = _movingSum(energy, cutoff, upper[1], 1)
+
+    # divide by the number of window in the neighbourhood
+    count = np.outer(rowCount, columnCount)
+    energy[count == 0] = float("INF")
+    np.divide(energy, count, out=energy, where=count > 0)
+
+    return energy
+
+
+def minimumEnergy(energyMap: ndarray, charge: ndarray, rangeX: ndarray, rangeY: ndarray) \
+        -> Tuple[Union[float, int], int, int, Union[float, int], Union[float, int], int, int]:
+    """
+    This function find the minimum energy and minimum charge on the positions scanned
+    Return the same format as _calculateEnergy, tie broken by smaller x then smaller y
+    """
+    # if no position can be scanned, return the init value used in _calculateEnergy
+    if len(rangeX) == 0 or len(rangeY) == 0:
+        return float("INF"), -1, -1, float("INF"), float("INF"), 0, 0
+
+    # only keep the position scanned
+    energyScan = np.round(energyMap[np.ix_(rangeX, rangeY)], ENERGY_DECIMALS)
+
+    # argmin return the first minimum in row major order, which is smaller x then smaller y
+    minIndex = np.unravel_index(np.argmin(energyScan), energyScan.shape)
+    min_x = int(rangeX[minIndex[0]])
+    min_y = int(rangeY[minIndex[1]])
+
+    return (energyScan[minIndex], min_x, min_y, int(charge[min_x, min_y])) + minimumCharge(charge, rangeX, rangeY)
+
+
+def minimumCharge(charge: ndarray, rangeX: ndarray, rangeY: ndarray) -> Tuple[int, int, int]:
+    """
+    This function find the minimum charge on the positions scanned and its position
+    """
+    chargeScan = charge[np.ix_(rangeX, rangeY)]
+    minIndex = np.unravel_index(np.argmin(chargeScan), chargeScan.shape)
+
+    return int(chargeScan[minIndex]), int(rangeX[minIndex[0]]), int(rangeY[minIndex[1]])
+
+
+def mergeResult(results: List[Tuple]) \
+        -> Tuple[Union[float, int], int, int, Union[float, int], Union[float, int], int, int]:
+    """
+    This function merge the results of parts scanned separately, in the same format as minimumEnergy
+    Minimum energy and minimum charge are found separately, tie broken by smaller x then smaller y
+    """
+    if len(results) == 0:
+        return float("INF"), -1, -1, float("INF"), float("INF"), 0, 0
+
+    energy = min(results, key=lambda result: (np.round(result[0], ENERGY_DECIMALS), result[1], result[2]))
+    charge = min(results, key=lambda result: (result[4], result[5], result[6]))
+
+    return tuple(energy[:4]) + tuple(charge[4:])
+
+
+def scanTrace(energyMap: ndarray, charge: ndarray, rangeX: ndarray, rangeY: ndarray) -> ndarray:
+    """
+    This function take the energy and charge of the positions scanned into a record array in format TRACE_DTYPE
+    The order is same as _calculateEnergy, loop x then y
+    """
+    index = np.ix_(rangeX, rangeY)
+
+    trace = np.zeros(len(rangeX) * len(rangeY), dtype=TRACE_DTYPE)
+    trace["x"] = np.repeat(rangeX, len(rangeY))
+    trace["y"] = np.tile(rangeY, len(rangeX))
+    trace["energy"] = np.reshape(energyMap[index], (-1,))
+    trace["charge"] = np.reshape(charge[index], (-1,))
+
+    return trace
+
+
+def neighbourCount(separation: int, intervalX: int, intervalY: int) -> int:
+    """
+    This function return the number of scan positions closer than separation to one position, include itself
+    Pick K separated minima one by one never look at more than K times this number of positions,
+    so every part only need to keep this many lowest positions for the merge to be exact
+    """
+    if separation <= 0:
+        return 1
+
+    return (2 * ((separation - 1) // intervalX) + 1) * (2 * ((separation - 1) // intervalY) + 1)
+
+
+def sortPosition(trace: ndarray) -> ndarray:
+    """
+    This function sort the record array in format TRACE_DTYPE by energy, tie broken by smaller x then smaller y
+    """
+    return trace[np.lexsort((trace["y"], trace["x"], np.round(trace["energy"], ENERGY_DECIMALS)))]
+
+
+def lowestPosition(energyMap: ndarray, charge: ndarray, rangeX: ndarray, rangeY: ndarray, number: int) -> ndarray:
+    """
+    This function find the lowest number of positions scanned on the energy map without sort the whole map
+    Return a record array in format TRACE_DTYPE, sorted by energy then x then y
+    """
+    if len(rangeX) == 0 or len(rangeY) == 0 or number <= 0:
+        return np.zeros(0, dtype=TRACE_DTYPE)
+
+    energyScan = np.reshape(np.round(energyMap[np.ix_(rangeX, rangeY)], ENERGY_DECIMALS), (-1,))
+
+    # keep every position not larger than the number-th lowest energy, so ties are broken by position
+    if len(energyScan) > number:
+        threshold = np.partition(energyScan, number - 1)[number - 1]
+        index = np.flatnonzero(energyScan <= threshold)
+    else:
+        index = np.arange(len(energyScan))
+
+    # index is in order of x then y, so sort by energy then index
+    index = index[np.lexsort((index, energyScan[index]))][:number]
+
+    lowest = np.zeros(len(index), dtype=TRACE_DTYPE)
+    lowest["x"] = rangeX[index // len(rangeY)]
+    lowest["y"] = rangeY[index % len(rangeY)]
+    lowest["energy"] = energyScan[index]
+    lowest["charge"] = charge[lowest["x"], lowest["y"]]
+
+    return lowest
+
+
+def separatedMinimum(candidateList: List[ndarray], number: int, separation: int) -> ndarray:
+    """
+    This function merge the sorted candidates of every part with a heap, take the lowest energy position one by one
+    and skip the position closer than separation to any position already taken, stop when number positions taken
+    Candidates are record arrays in format TRACE_DTYPE sorted by sortPosition, return the same format
+    """
+    picked = []
+    for position in heapq.merge(*candidateList, key=_positionKey):
+        if len(picked) == number:
+            break
+
+        # distance to all positions taken, number is small so check one by one
+        if all((position["x"] - p["x"]) ** 2 + (position["y"] - p["y"]) ** 2 >= separation ** 2 for p in picked):
+            picked.append(position)
+
+    return np.array(picked, dtype=TRACE_DTYPE)
+
+
+def _positionKey(position: np.void) -> Tuple[float, int, int]:
+    """
+    This helper function return the key to sort one position, same order as sortPosition
+    """
+    return float(np.round(position["energy"], ENERGY_DECIMALS)), int(position["x"]), int(position["y"])
+
+
+def _movingSum(array: ndarray, cutoff: int, upper: int, axis: int) -> Tuple[ndarray, ndarray]:
+    """
+    This helper function calculate the sum of array over [i - cutoff, i + cutoff] along the axis by prefix sum
+    Index larger than upper is not counted, also return how many values are summed for each index
+    """
+    length = array.shape[axis]
+    upper = min(upper, length - 1)
+
+    # start (inclusive) and end (exclusive) of the range for each index
+    index = np.arange(length)
+    start = np.minimum(np.maximum(index - cutoff, 0), upper + 1)
+    end = np.maximum(np.minimum(index + cutoff, upper) + 1, start)
+
+    # prefix sum with a zero in front
+    prefixShape = list(array.shape)
+    prefixShape[axis] = upper + 2
+    prefix = np.zeros(prefixShape)
+    body = prefix[1:] if axis == 0 else prefix[:, 1:]
+    np.cumsum(np.take(array, np.arange(upper + 1), axis=axis), axis=axis, out=body)
+
+    return np.take(prefix, end, axis=axis) - np.take(prefix, start, axis=axis), end - start
+
+
+def _uniformStep(positions: ndarray) -> int:
+    """
+    This function return the step between positions if all steps are same and positive, otherwise return 0
+    """
+    if len(positions) == 1:
+        return 1
+
+    step = positions[1] - positions[0]
+    if step > 0 and np.all(np.diff(positions) == step):
+        return int(step)
+
+    return 0
+
+
+def _nextFastLength(n: int) -> int:
+    """
+    This helper function find the smallest number not less than n which only has factor 2, 3 and 5
+    """
+    length = max(n, 1)
+    while True:
+        remain = length
+        for factor in (2, 3, 5):
+            while remain % factor == 0:
+                remain //= factor
+        if remain == 1:
+            return length
+        length += 1
@@ -0,0 +1,317 @@
+"""
+This program:
+- Keeps one process pool for all energy scans of a simulator
+- Preloads the film into every worker process, so each scan only sends the bacteria and the range
+- Keeps a thread pool instead for the vectorized engines, threads use the film of this process without copy
+- Limits the threads of BLAS in every worker, so workers times BLAS threads is not over the cpu number
+"""
+import itertools
+import multiprocessing as mp
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from multiprocessing.pool import Pool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Iterable, Iterator, Union, Dict, Tuple
+
+import numpy as np
+from numpy import ndarray
+
+from SimulatorFile.EnergyEngine import filmValue
+from SimulatorFile.SharedSurface import SharedDescriptor, shareArray, attachArray, releaseArray
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    # threadpoolctl is optional, without it only the environment variables read by BLAS when it starts are set
+    threadpool_limits = None
+
+# backend runs the workers, "PROCESS" is a process pool, "THREAD" is a thread pool in this process
+POOL_BACKEND = ("PROCESS", "THREAD")
+
+# engines only call numpy on large arrays, numpy releases the GIL, so they can run in threads
+THREAD_ENGINE = ("SLIDING", "WINDOW", "PACKED", "SPARSE", "SPARSE_FILM", "TILED")
+
+# environment variables of the thread number of BLAS libraries
+BLAS_THREAD_VARIABLE = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS")
+
+# film attached in this worker process, key is the name of shared memory, only the latest film is kept
+# films of thread pools are kept here too, without shared memory
+_WORKER_FILM: Dict[str, Tuple[Union[SharedMemory, None], ndarray]] = {}
+
+# number to name the films of thread pools
+_THREAD_FILM_COUNT = itertools.count()
+
+
+def cpuNumber() -> int:
+    """
+    This function return the number of cpu can be used, from the slurm setting
+    """
+    return max(int(os.environ.get('SLURM_CPUS_PER_TASK', default=1)), 1)
+
+
+def limitBlasThreads(threadNum: int) -> Tuple[Dict[str, Union[str, None]], object]:
+    """
+    This function limit the threads used by BLAS in this process to threadNum
+    Return the environment variables before and the limits of threadpoolctl, give them to restoreBlasThreads to undo it
+    """
+    environment = {variable: os.environ.get(variable) for variable in BLAS_THREAD_VARIABLE}
+    for variable in BLAS_THREAD_VARIABLE:
+        os.environ[variable] = str(threadNum)
+
+    limits = None
+    if threadpool_limits is not None:
+        limits = threadpool_limits(limits=threadNum, user_api="blas")
+
+    return environment, limits
+
+
+def restoreBlasThreads(previous: Tuple[Dict[str, Union[str, None]], object]) -> None:
+    """
+    This function set the threads of BLAS in this process back to the ones before limitBlasThreads
+    """
+    environment, limits = previous
+    for variable, value in environment.items():
+        if value is None:
+            os.environ.pop(variable, None)
+        else:
+            os.environ[variable] = value
+
+    if limits is not None:
+        limits.restore_original_limits()
+
+
+def bufferKey(array: ndarray) -> Tuple[int, tuple, tuple, str]:
+    """
+    This function return a cheap key of the memory array reads, the same key means the same points
+    while the array is kept alive and not changed in place, films are never changed once built
+    """
+    return array.__array_interface__["data"][0], array.shape, array.strides, array.dtype.str
+
+
+def startPool(processNum: int, film: ndarray = None, backend: str = "PROCESS", blasThreadNum: int = 1) \
+        -> "EnergyPool":
+    """
+    This function start the pool of backend with processNum workers, each worker use blasThreadNum BLAS threads
+    """
+    if backend.upper() == "PROCESS":
+        return EnergyPool(processNum, film, blasThreadNum)
+    elif backend.upper() == "THREAD":
+        return ThreadEnergyPool(processNum, film, blasThreadNum)
+    else:
+        raise RuntimeError("Unknown pool backend: {}".format(backend))
+
+
+class EnergyPool:
+    """
+    This class owns a process pool reused by every energy scan of one simulation
+    The film is put into shared memory once, every worker attaches it once and keeps it until a new film comes
+    """
+    processNum: int
+    blasThreadNum: int
+    pool: Pool
+    film: Union[ndarray, None]
+    filmShared: Union[SharedMemory, None]
+    filmDescriptor: Union[SharedDescriptor, None]
+    filmValue: Union[Tuple[bool, bool], None]
+    filmSource: Union[ndarray, None]
+    filmKey: Union[Tuple[int, tuple, tuple, str], None]
+
+    def __init__(self, processNum: int, film: ndarray = None, blasThreadNum: int = 1) -> None:
+        """
+        Start the worker processes, if film is given, every worker attach it when start
+        Every worker use blasThreadNum BLAS threads
+        """
+        self.processNum = processNum
+        self.blasThreadNum = blasThreadNum
+        self.film = None
+        self.filmShared = None
+        self.filmDescriptor = None
+        self.filmValue = None
+        self.filmSource = None
+        self.filmKey = None
+
+        if film is not None:
+            self._shareFilm(film)
+
+        self.pool = mp.Pool(processes=processNum, initializer=_initWorker,
+                            initargs=(self.filmDescriptor, self.blasThreadNum))
+
+    def setFilm(self, film: ndarray) -> SharedDescriptor:
+        """
+        Put the film into shared memory if it is not the film already shared, return the descriptor for workers
+        The film is compared by bufferKey, the points are not read again for every scan
+        """
+        if self.filmKey != bufferKey(film):
+            self._releaseFilm()
+            self._shareFilm(film)
+
+        return self.filmDescriptor
+
+    def resize(self, processNum: int) -> None:
+        """
+        Restart the workers with processNum processes if the number changed, the film is preloaded again
+        """
+        if processNum == self.processNum:
+            return None
+
+        self.pool.close()
+        self.pool.join()
+
+        self.processNum = processNum
+        self.pool = mp.Pool(processes=processNum, initializer=_initWorker,
+                            initargs=(self.filmDescriptor, self.blasThreadNum))
+
+    def imapUnordered(self, func: Callable, data: Iterable) -> Iterator:
+        """
+        Run func on every data in the workers, yield the results once they are done
+        """
+        return self.pool.imap_unordered(func, data)
+
+    def close(self) -> None:
+        """
+        Wait for all workers to exit and remove the shared film
+        """
+        self.pool.close()
+        self.pool.join()
+        self._releaseFilm()
+
+    def _shareFilm(self, film: ndarray) -> None:
+        """
+        Copy the film into a new shared memory, keep the given film alive so its key is not reused by another array
+        The points of the film are checked once here for all scans of it, see filmValue
+        """
+        self.filmShared, self.filmDescriptor = shareArray(film)
+        self.film = np.ndarray(film.shape, dtype=self.filmDescriptor[2], buffer=self.filmShared.buf)
+        self.filmValue = filmValue(self.film)
+        self.filmSource = film
+        self.filmKey = bufferKey(film)
+
+    def _releaseFilm(self) -> None:
+        """
+        Remove the shared film, workers still attached keep their copy until a new film comes
+        """
+        if self.filmShared is None:
+            return None
+
+        # drop the view before close the shared memory
+        self.film = None
+        self.filmValue = None
+        self.filmSource = None
+        self.filmKey = None
+        releaseArray(self.filmShared)
+        self.filmShared = None
+        self.filmDescriptor = None
+
+
+class ThreadEnergyPool(EnergyPool):
+    """
+    This class owns a thread pool reused by every energy scan of one simulation, same use as EnergyPool
+    The film is not copied, threads find it by its name in this process, a new film is found by setFilm of EnergyPool
+    BLAS of this process is limited while the pool is open, and set back when it is closed
+    """
+    executor: ThreadPoolExecutor
+    blasLimit: Union[Tuple[Dict[str, Union[str, None]], object], None]
+
+    def __init__(self, processNum: int, film: ndarray = None, blasThreadNum: int = 1) -> None:
+        """
+        Start the worker threads, BLAS calls of every thread use blasThreadNum threads
+        """
+        self.processNum = processNum
+        self.blasThreadNum = blasThreadNum
+        self.film = None
+        self.filmShared = None
+        self.filmDescriptor = None
+        self.filmValue = None
+        self.filmSource = None
+        self.filmKey = None
+
+        if film is not None:
+            self._shareFilm(film)
+
+        self.blasLimit = limitBlasThreads(blasThreadNum)
+        self.executor = ThreadPoolExecutor(max_workers=processNum)
+
+    def resize(self, processNum: int) -> None:
+        """
+        Restart the threads with processNum threads if the number changed
+        """
+        if processNum == self.processNum:
+            return None
+
+        self.executor.shutdown(wait=True)
+
+        self.processNum = processNum
+        self.executor = ThreadPoolExecutor(max_workers=processNum)
+
+    def imapUnordered(self, func: Callable, data: Iterable) -> Iterator:
+        """
+        Run func on every data in the threads, yield the results once they are done
+        """
+        futures = [self.executor.submit(func, item) for item in data]
+
+        return (future.result() for future in as_completed(futures))
+
+    def close(self) -> None:
+        """
+        Wait for all threads to exit, drop the film and set the BLAS threads of this process back
+        """
+        self.executor.shutdown(wait=True)
+        self._releaseFilm()
+
+        if self.blasLimit is not None:
+            restoreBlasThreads(self.blasLimit)
+            self.blasLimit = None
+
+    def _shareFilm(self, film: ndarray) -> None:
+        """
+        Keep the film under a new name, threads read the film itself
+        The points of the film are checked once here for all scans of it, see filmValue
+        """
+        self.film = film
+        self.filmValue = filmValue(film)
+        self.filmSource = film
+        self.filmKey = bufferKey(film)
+        self.filmDescriptor = ("thread_film_{}_{}".format(os.getpid(), next(_THREAD_FILM_COUNT)), film.shape,
+                               film.dtype.str)
+        _WORKER_FILM[self.filmDescriptor[0]] = (None, film)
+
+    def _releaseFilm(self) -> None:
+        """
+        Drop the film kept for threads
+        """
+        if self.filmDescriptor is None:
+            return None
+
+        _WORKER_FILM.pop(self.filmDescriptor[0], None)
+        self.film = None
+        self.filmValue = None
+        self.filmSource = None
+        self.filmKey = None
+        self.filmDescriptor = None
+
+
+def attachFilm(descriptor: SharedDescriptor) -> ndarray:
+    """
+    This function return the film shared with this worker process, attach it only if it is a new film
+    """
+    name = descriptor[0]
+    if name not in _WORKER_FILM:
+        # close the old film, no task is using it, films of thread pools are not closed here
+        for oldName in [oldName for oldName, (sharedMemory, _) in _WORKER_FILM.items() if sharedMemory is not None]:
+            sharedMemory, film = _WORKER_FILM.pop(oldName)
+            del film
+            sharedMemory.close()
+
+        _WORKER_FILM[name] = attachArray(descriptor)
+
+    return _WORKER_FILM[name][1]
+
+
+def _initWorker(descriptor: Union[SharedDescriptor, None], blasThreadNum: int = 1) -> None:
+    """
+    This helper function is the initializer of every worker process, limit the BLAS threads and preload the film
+    if there is one
+    """
+    limitBlasThreads(blasThreadNum)
+    if descriptor is not None:
+        attachFilm(descriptor)
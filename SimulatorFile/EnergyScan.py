@@ -2,6 +2,7 @@
 This program:
 - Runs the energy scan simulator.
 """
+import os
 from datetime import datetime
 from typing import Tuple, Union, List, Dict
 
@@ -9,8 +10,15 @@ import numpy as np
 from numpy import ndarray
 from openpyxl.worksheet._write_only import WriteOnlyWorksheet
 from openpyxl.worksheet.worksheet import Worksheet
-from SimulatorFile.EnergyCalculator import interact
-from ExternalIO import showMessage, writeLog, saveResult, timeMonitor
+from SimulatorFile.EnergyCalculator import interact, interactBatch, interactMatrix, interactOrientation, interactTiled
+from SimulatorFile.EnergyPool import POOL_BACKEND, THREAD_ENGINE, EnergyPool, cpuNumber, startPool
+from SimulatorFile.EnergySearch import PYRAMID_CANDIDATE, resetPyramidAgreement
+from SimulatorFile.EnergyTile import TILE_SIZE
+from SimulatorFile.SpectrumCache import SPECTRUM_CACHE_LIMIT
+from SimulatorFile.SurfaceCache import setCachePath
+from SimulatorFile.EnergyEngine import ENERGY_MODEL, SCREENING_LENGTH, ORIENTATION, orientationName
+from ExternalIO import showMessage, writeLog, saveResult, timeMonitor, appendCheckpoint, loadCheckpoint, \
+    saveCheckpointSurface, loadCheckpointSurface
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter  # allows access to letters of each column
 from SimulatorFile.Simulator import Simulator
@@ -21,6 +29,25 @@ class EnergySimulator(Simulator):
     This class is used for bacteria scan film surface energy simulation
     """
     interactType: Union[None, str]
+    energyEngine: str
+    recordTrace: bool
+    pyramidCandidate: int
+    pyramidCheckNumber: int
+    topK: int
+    minSeparation: int
+    saveEnergyMap: bool
+    filmPath: str
+    tileSize: int
+    pool: Union[None, EnergyPool]
+    autoTune: bool
+    checkpointPath: str
+    energyModel: str
+    screeningLength: float
+    orientationNumber: int
+    spectrumCacheLimit: int
+    surfaceCachePath: str
+    poolBackend: str
+    blasThreadNum: int
 
     def __init__(self, trail: int, dimension: int,
                  filmSeed: int, filmSurfaceSize: Union[Tuple[int, int], Tuple[int, int, int]], filmSurfaceShape: str,
@@ -51,6 +78,24 @@ class EnergySimulator(Simulator):
         # set some variable
         self.interactType = None
         self.cutoff = -1
+        self.energyEngine = "DIRECT"
+        self.recordTrace = False
+        self.pyramidCandidate = PYRAMID_CANDIDATE
+        self.pyramidCheckNumber = 1
+        self.topK = 1
+        self.minSeparation = 0
+        self.saveEnergyMap = False
+        self.filmPath = ""
+        self.tileSize = TILE_SIZE
+        self.autoTune = True
+        self.checkpointPath = ""
+        self.energyModel = "CONTACT"
+        self.screeningLength = SCREENING_LENGTH
+        self.orientationNumber = 1
+        self.spectrumCacheLimit = SPECTRUM_CACHE_LIMIT
+        self.surfaceCachePath = ""
+        self.poolBackend = "PROCESS"
+        self.blasThreadNum = 1
 
         # call parent to generate simulator
         Simulator.__init__(self, simulationType, trail, dimension, simulatorType,
@@ -72,50 +117,125 @@ class EnergySimulator(Simulator):
         showMessage("Start to run simulation baed on simulation type")
         writeLog(self.__dict__)
 
-        # record the number of simulation did
-        currIter = 0
-
-        # init the end of iterator
-        end = False
-
-        # type 1 simulation
-        # only one film and one bacteria
-        if self.simulationType == 1:
-            end = True
-            self._simulate(currIter, self.filmManager.film[0].surfaceWithDomain,
-                           self.bacteriaManager.bacteria[0].surfaceWithDomain, end)
-
-        # type 2 simulation
-        elif self.simulationType == 2:
-            # One film, multiple different bacteria, every bacteria scan the surface once
-            for i in range(self.bacteriaManager.bacteriaNum):
-                showMessage("This is type 2 simulation with simulation #: {}".format(i))
-
-                # change end indicator
-                if i == self.bacteriaManager.bacteriaNum - 1:
-                    end = True
-
-                # start simulation
+        if self.energyModel.upper() not in ENERGY_MODEL:
+            raise RuntimeError("Unknown energy model: {}".format(self.energyModel))
+
+        if self.orientationNumber < 1 or self.orientationNumber > len(ORIENTATION):
+            raise RuntimeError("Orientation number need to be 1 to {}".format(len(ORIENTATION)))
+
+        # tiled engine read one film from the file
+        if self.energyEngine.upper() == "TILED":
+            if self.filmPath == "":
+                raise RuntimeError("TILED engine need the film file in filmPath")
+            if self.simulationType == 3:
+                raise RuntimeError("TILED engine only scan the film in filmPath, simulation type 3 is not supported")
+            if self.orientationNumber > 1:
+                raise RuntimeError("TILED engine only scan one orientation of bacteria")
+
+        # every film and bacteria pair is scanned by FFT with the spectra kept in cache
+        if self.simulationType == 4:
+            if self.energyEngine.upper() == "TILED":
+                raise RuntimeError("TILED engine only scan the film in filmPath, simulation type 4 is not supported")
+            if self.orientationNumber > 1:
+                raise RuntimeError("Simulation type 4 only scan one orientation of bacteria")
+
+        # threads only help the engines release the GIL
+        if self.poolBackend.upper() not in POOL_BACKEND:
+            raise RuntimeError("Unknown pool backend: {}".format(self.poolBackend))
+        if self.poolBackend.upper() == "THREAD" and self.energyEngine.upper() not in THREAD_ENGINE + ("AUTO",):
+            raise RuntimeError("THREAD pool backend only support energy engine {} and AUTO, energy engine is: {}"
+                               .format(", ".join(THREAD_ENGINE), self.energyEngine))
+
+        # spectra, integral images and pyramid levels of films are saved into the folder and read back by later scans
+        setCachePath(self.surfaceCachePath)
+
+        # agreement of pyramid search is only counted for the scans of this simulation
+        resetPyramidAgreement()
+
+        # iterations finished by the run before restart, key is the iteration, surfaces are restored before the
+        # first film is preloaded
+        finished = self._loadCheckpoint()
+
+        # one process or thread pool for all scans of this simulation, the first film is preloaded in every worker
+        # orientations and simulation type 4 are scanned by FFT in this process, no pool is needed
+        self.pool = None
+        scanInProcess = self.orientationNumber > 1 or self.simulationType == 4
+        if not scanInProcess and self.energyEngine.upper() in ["DIRECT", "PRUNED", "SLIDING", "WINDOW", "PACKED",
+                                                                "SPARSE", "AUTO"]:
+            self.pool = startPool(cpuNumber(), self.filmManager.film[0].surfaceWithDomain[0], self.poolBackend,
+                                  self.blasThreadNum)
+        elif self.energyEngine.upper() == "TILED" or \
+                (not scanInProcess and self.energyEngine.upper() == "SPARSE_FILM"):
+            # sparse film is carried by the tasks, workers do not need the film
+            self.pool = startPool(cpuNumber(), None, self.poolBackend, self.blasThreadNum)
+
+        # close the pool even if the simulation failed
+        try:
+            # record the number of simulation did
+            currIter = 0
+
+            # init the end of iterator
+            end = False
+
+            # type 1 simulation
+            # only one film and one bacteria
+            if self.simulationType == 1:
+                end = True
                 self._simulate(currIter, self.filmManager.film[0].surfaceWithDomain,
-                               self.bacteriaManager.bacteria[currIter].surfaceWithDomain, end)
-                currIter += 1
-
-        # type 3 simulation
-        elif self.simulationType == 3:
-            # multiple different film, one bacteria, bacteria scan every surface once
-            for i in range(self.filmManager.filmNum):
-                showMessage("This is type 3 simulation with simulation #: {}".format({i}))
-
-                # change end indicator
-                if i == self.filmManager.filmNum - 1:
-                    end = True
-
-                # start simulation
-                self._simulate(currIter, self.filmManager.film[currIter].surfaceWithDomain,
                                self.bacteriaManager.bacteria[0].surfaceWithDomain, end)
-                currIter += 1
-        else:
-            raise RuntimeError("Wrong simulation type")
+
+            # type 2 simulation with FFT engine, prepare the film once and scan all bacteria in batch
+            elif self.simulationType == 2 and self.energyEngine.upper() == "FFT" and self.orientationNumber == 1:
+                self._simulateBatch(finished)
+
+            # type 2 simulation
+            elif self.simulationType == 2:
+                # One film, multiple different bacteria, every bacteria scan the surface once
+                for i in range(self.bacteriaManager.bacteriaNum):
+                    showMessage("This is type 2 simulation with simulation #: {}".format(i))
+
+                    # change end indicator
+                    if i == self.bacteriaManager.bacteriaNum - 1:
+                        end = True
+
+                    # start simulation, iteration finished before restart only write the result
+                    if currIter in finished:
+                        self._output(tuple(finished[currIter]["result"]), currIter, end, finished[currIter]["time"],
+                                     finished[currIter]["orientation"])
+                    else:
+                        self._simulate(currIter, self.filmManager.film[0].surfaceWithDomain,
+                                       self.bacteriaManager.bacteria[currIter].surfaceWithDomain, end)
+                    currIter += 1
+
+            # type 3 simulation
+            elif self.simulationType == 3:
+                # multiple different film, one bacteria, bacteria scan every surface once
+                for i in range(self.filmManager.filmNum):
+                    showMessage("This is type 3 simulation with simulation #: {}".format({i}))
+
+                    # change end indicator
+                    if i == self.filmManager.filmNum - 1:
+                        end = True
+
+                    # start simulation, iteration finished before restart only write the result
+                    if currIter in finished:
+                        self._output(tuple(finished[currIter]["result"]), currIter, end, finished[currIter]["time"],
+                                     finished[currIter]["orientation"])
+                    else:
+                        self._simulate(currIter, self.filmManager.film[currIter].surfaceWithDomain,
+                                       self.bacteriaManager.bacteria[0].surfaceWithDomain, end)
+                    currIter += 1
+
+            # type 4 simulation
+            # multiple different film, multiple different bacteria, every bacteria scan every film once
+            elif self.simulationType == 4:
+                self._simulateMatrix()
+            else:
+                raise RuntimeError("Wrong simulation type")
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool = None
 
     def _simulate(self, currIter: int, film: ndarray, bacteria: ndarray, end: bool) -> None:
         """
@@ -137,14 +257,158 @@ class EnergySimulator(Simulator):
         else:
             cutoff = 0
 
-        # call simulation
-        result = interact(self.interactType, self.intervalX, self.intervalY, film, bacteria, currIter, cutoff,
-                          self.dimension)
+        # call simulation, tiled engine scan the film in the file instead of the film generated
+        orientation = 0
+        if self.orientationNumber > 1:
+            result, orientation = interactOrientation(self.interactType, self.intervalX, self.intervalY, film,
+                                                      bacteria, currIter, cutoff, self.dimension,
+                                                      self.orientationNumber, self.recordTrace, self.topK,
+                                                      self.minSeparation, self.saveEnergyMap, self.energyModel,
+                                                      self.screeningLength)
+        elif self.energyEngine.upper() == "TILED":
+            result = interactTiled(self.interactType, self.intervalX, self.intervalY, self.filmPath, bacteria,
+                                   currIter, self.dimension, self.tileSize, self.recordTrace, self.topK,
+                                   self.minSeparation, self.saveEnergyMap, self.pool, self.energyModel,
+                                   self.screeningLength)
+        else:
+            result = interact(self.interactType, self.intervalX, self.intervalY, film, bacteria, currIter, cutoff,
+                              self.dimension, self.energyEngine, self.recordTrace, self.pyramidCandidate, self.topK,
+                              self.minSeparation, self.saveEnergyMap, self.pool,
+                              self.autoTune and self.simulationType != 1, self.energyModel, self.screeningLength,
+                              currIter < self.pyramidCheckNumber)
 
         showMessage("Interact done")
 
         # set the output
-        self._output(result, currIter, end)
+        self._output(result, currIter, end, orientation=orientation)
+
+    def _simulateBatch(self, finished: Dict[int, Dict]) -> None:
+        """
+        This function scan one film with all bacteria in batch and output the result of each bacteria
+        Bacteria in finished are not scanned again, their result comes from the checkpoint
+        Prerequisite: surface already generated
+        """
+        writeLog("This is _simulateBatch in Simulation")
+        showMessage("Start to run simulation in batch")
+
+        # check does cutoff value set
+        if self.interactType.upper() in ["CUTOFF", "CUT-OFF"]:
+            if self.cutoff < 0:
+                raise RuntimeError("Cutoff value is not assign or not assign properly")
+            else:
+                cutoff = self.cutoff
+        else:
+            cutoff = 0
+
+        # bacteria not finished and their iterations, files of each bacteria are named by its iteration
+        iterList = [i for i in range(self.bacteriaManager.bacteriaNum) if i not in finished]
+        bacteriaList = [self.bacteriaManager.bacteria[i].surfaceWithDomain for i in iterList]
+
+        # call simulation, result of each bacteria comes in order
+        results = interactBatch(self.interactType, self.intervalX, self.intervalY,
+                                self.filmManager.film[0].surfaceWithDomain, bacteriaList, cutoff, self.dimension,
+                                self.recordTrace, topK=self.topK, minSeparation=self.minSeparation,
+                                saveEnergyMap=self.saveEnergyMap, energyModel=self.energyModel,
+                                screeningLength=self.screeningLength, iterList=iterList)
+
+        for currIter in range(self.bacteriaManager.bacteriaNum):
+            showMessage("This is type 2 simulation with simulation #: {}".format(currIter))
+
+            # set the output, iteration finished before restart use the result in checkpoint
+            end = currIter == self.bacteriaManager.bacteriaNum - 1
+            if currIter in finished:
+                self._output(tuple(finished[currIter]["result"]), currIter, end, finished[currIter]["time"],
+                             finished[currIter]["orientation"])
+            else:
+                self._output(next(results), currIter, end)
+
+    def _simulateMatrix(self) -> None:
+        """
+        This function scan every film with every bacteria and output the result of each pair
+        The result of film i and bacteria j is the iteration i * number of bacteria + j
+        Prerequisite: surface already generated
+        """
+        writeLog("This is _simulateMatrix in Simulation")
+        showMessage("Start to run simulation of every film and bacteria pair")
+
+        # check does cutoff value set
+        if self.interactType.upper() in ["CUTOFF", "CUT-OFF"]:
+            if self.cutoff < 0:
+                raise RuntimeError("Cutoff value is not assign or not assign properly")
+            else:
+                cutoff = self.cutoff
+        else:
+            cutoff = 0
+
+        filmList = [film.surfaceWithDomain for film in self.filmManager.film]
+        bacteriaList = [bacteria.surfaceWithDomain for bacteria in self.bacteriaManager.bacteria]
+
+        # pairs come in the order of the cache, the last pair is the last one
+        pairNum = len(filmList) * len(bacteriaList)
+        for count, (filmIndex, bacteriaIndex, result) in enumerate(
+                interactMatrix(self.interactType, self.intervalX, self.intervalY, filmList, bacteriaList, cutoff,
+                               self.dimension, self.recordTrace, self.spectrumCacheLimit, self.topK,
+                               self.minSeparation, self.saveEnergyMap, self.energyModel, self.screeningLength)):
+            showMessage("This is type 4 simulation with film #: {}, bacteria #: {}".format(filmIndex, bacteriaIndex))
+
+            self._output(result, filmIndex * len(bacteriaList) + bacteriaIndex, count == pairNum - 1)
+
+    def _surfaceIndex(self, currIter: int) -> Tuple[int, int]:
+        """
+        Return the index of film and bacteria scanned in this iteration
+        """
+        if self.simulationType == 3:
+            return currIter, 0
+        elif self.simulationType == 4:
+            return divmod(currIter, self.bacteriaManager.bacteriaNum)
+        else:
+            return 0, currIter
+
+    def _checkpointKey(self, currIter: int) -> List:
+        """
+        Return what identify the scan of this iteration in the checkpoint, same seeds generate the same surfaces
+        Exact engines find the same minimum, so they share the results, the result of PYRAMID is only reused by
+        PYRAMID with the same number of candidates
+        """
+        filmIndex, bacteriaIndex = self._surfaceIndex(currIter)
+        film = self.filmManager.film[filmIndex]
+        bacteria = self.bacteriaManager.bacteria[bacteriaIndex]
+
+        # orientations and simulation type 4 are scanned by FFT whatever the engine is
+        engine = "EXACT"
+        if self.energyEngine.upper() == "PYRAMID" and self.orientationNumber == 1 and self.simulationType != 4:
+            engine = "PYRAMID_{}".format(self.pyramidCandidate)
+
+        return [self.trail, self.simulationType, self.dimension, self.interactType, self.cutoff, self.intervalX,
+                self.intervalY, self.energyModel, self.screeningLength, self.orientationNumber, int(film.seed),
+                int(bacteria.seed), engine]
+
+    def _loadCheckpoint(self) -> Dict[int, Dict]:
+        """
+        Read the iterations finished before restart from the checkpoint file, only for simulation type 2 and 3
+        An iteration is finished only if it scanned the same film and bacteria as this run
+        """
+        finished = {}
+        if self.checkpointPath == "" or self.simulationType not in [2, 3]:
+            return finished
+
+        self._checkpointSurface()
+
+        # number of iterations of this run
+        if self.simulationType == 2:
+            iterNum = self.bacteriaManager.bacteriaNum
+        else:
+            iterNum = self.filmManager.filmNum
+
+        for record in loadCheckpoint(self.checkpointPath):
+            currIter = record["iter"]
+            if currIter < iterNum and record["key"] == self._checkpointKey(currIter):
+                finished[currIter] = record
+
+        showMessage("{} of {} iterations are finished in checkpoint {}".format(len(finished), iterNum,
+                                                                              self.checkpointPath))
+
+        return finished
 
     def _initOutput(self) -> Tuple[Workbook, Union[WriteOnlyWorksheet, Worksheet]]:
         """
@@ -189,6 +453,10 @@ class EnergySimulator(Simulator):
                 ws1.cell(2, i, 0)
                 count += 1
 
+        # orientation of bacteria at the minimum energy, after the count of simulation type 2
+        if self.orientationNumber > 1:
+            ws1.cell(1, self._orientationColumn(), "Orientation")
+
         # adjust column width to text length
         for i in range(ws1.max_column):
             text = ws1.cell(1, i + 1).value
@@ -201,18 +469,68 @@ class EnergySimulator(Simulator):
 
         return (wb, ws1)
 
-    def _output(self, result: Tuple, currIter: int, end: bool) -> None:
+    def _checkpointSurface(self) -> None:
+        """
+        Save the surfaces of this run next to the checkpoint file, or restore them if they are saved before restart
+        Domains are not placed the same way every time with the same seed, so restore them to scan the same surfaces
+        """
+        path = self.checkpointPath + ".surface.npz"
+        surfaceList = [("film_{}".format(i), film) for i, film in enumerate(self.filmManager.film)] + \
+                      [("bacteria_{}".format(i), bacteria) for i, bacteria in enumerate(self.bacteriaManager.bacteria)]
+
+        if not os.path.exists(path):
+            saved = {}
+            for name, surface in surfaceList:
+                saved[name + "_seed"] = np.array(surface.seed)
+                saved[name + "_surface"] = surface.surfaceWithDomain
+                saved[name + "_conc"] = np.array(surface.realDomainConc, dtype=float)
+            saveCheckpointSurface(saved, path)
+            return None
+
+        saved = loadCheckpointSurface(path)
+        for name, surface in surfaceList:
+            if name + "_seed" not in saved or int(saved[name + "_seed"]) != int(surface.seed) or \
+                    saved[name + "_surface"].shape != surface.surfaceWithDomain.shape:
+                raise RuntimeError("Surface {} in checkpoint {} is not from this simulation, use a new checkpointPath"
+                                   .format(name, self.checkpointPath))
+
+            surface.surfaceWithDomain = saved[name + "_surface"]
+            conc = saved[name + "_conc"].tolist()
+            surface.realDomainConc = tuple(conc) if isinstance(conc, list) else conc
+
+        showMessage("Surfaces restored from {}".format(path))
+
+    def _orientationColumn(self) -> int:
+        """
+        Return the column of the orientation in the output, after the 30 columns of count in simulation type 2
+        """
+        return 18 + 30 if self.simulationType == 2 else 18
+
+    def _output(self, result: Tuple, currIter: int, end: bool, timeUsed: int = None, orientation: int = 0) -> None:
         """
         Output the simulation result into a file
         Copy from old code with minor change
+        timeUsed is only given for the iteration finished before restart, otherwise the result is also appended into
+        the checkpoint file if there is one
+        orientation is the index in ORIENTATION of bacteria at the minimum energy
         """
         writeLog("This is _output in Simulation")
         showMessage("Start to write result into out put with iter: {}".format(currIter))
         writeLog("result is: {}, currIter is: {}, end is: {}".format(result, currIter, end))
 
         # calculate the time use
-        time_consume = (datetime.now() - self.startTime)
-        time_consume = time_consume.seconds
+        if timeUsed is None:
+            time_consume = (datetime.now() - self.startTime)
+            time_consume = time_consume.seconds
+
+            # save this iteration as finished
+            if self.checkpointPath != "" and self.simulationType in [2, 3]:
+                appendCheckpoint({"iter": currIter, "key": self._checkpointKey(currIter),
+                                  "result": [value.item() if isinstance(value, np.generic) else value
+                                             for value in result],
+                                  "time": time_consume, "orientation": orientation}, self.checkpointPath)
+        else:
+            time_consume = timeUsed
 
         # rename the out put
         wb = self.output[0]
@@ -237,17 +555,11 @@ class EnergySimulator(Simulator):
         ws1.cell(row_pos, 6,
                  str(self.bacteriaManager.bacteriaDomainShape) + " : " + str(self.bacteriaManager.bacteriaDomainSize))
 
-        if self.simulationType == 3:
-            ws1.cell(row_pos, 7, self.filmManager.film[currIter].seed)
-            ws1.cell(row_pos, 8, str(self.filmManager.film[currIter].realDomainConc))
-            ws1.cell(row_pos, 9, self.bacteriaManager.bacteria[0].seed)
-            ws1.cell(row_pos, 10, str(self.bacteriaManager.bacteria[0].realDomainConc))
-
-        else:
-            ws1.cell(row_pos, 7, self.filmManager.film[0].seed)
-            ws1.cell(row_pos, 8, str(self.filmManager.film[0].realDomainConc))
-            ws1.cell(row_pos, 9, self.bacteriaManager.bacteria[currIter].seed)
-            ws1.cell(row_pos, 10, str(self.bacteriaManager.bacteria[currIter].realDomainConc))
+        filmIndex, bacteriaIndex = self._surfaceIndex(currIter)
+        ws1.cell(row_pos, 7, self.filmManager.film[filmIndex].seed)
+        ws1.cell(row_pos, 8, str(self.filmManager.film[filmIndex].realDomainConc))
+        ws1.cell(row_pos, 9, self.bacteriaManager.bacteria[bacteriaIndex].seed)
+        ws1.cell(row_pos, 10, str(self.bacteriaManager.bacteria[bacteriaIndex].realDomainConc))
 
         ws1.cell(row_pos, 11, min_energy)
         ws1.cell(row_pos, 12, min_x)
@@ -259,6 +571,8 @@ class EnergySimulator(Simulator):
             ws1.cell(row_pos, 17, self.interactType)
         else:
             ws1.cell(row_pos, 17, "{}: {}".format(self.interactType, self.cutoff))
+        if self.orientationNumber > 1:
+            ws1.cell(row_pos, self._orientationColumn(), orientationName(orientation))
 
         # if this is not the last iterator, update the time and return this
         if not end:
@@ -293,6 +607,19 @@ class EnergySimulator(Simulator):
             ws1.cell(self.bacteriaManager.bacteriaNum + 2, 11, "Average energy")
             ws1.cell(self.bacteriaManager.bacteriaNum + 3, 11, average_energy)
 
+        # minimum energy of every pair for simulation type 4, one row for each film and one column for each bacteria
+        if self.simulationType == 4:
+            ws2 = wb.create_sheet("Min Energy Matrix", 1)
+            ws2.cell(1, 1, "Film Seed # \\ Bacteria Seed #")
+            bacteriaNum = self.bacteriaManager.bacteriaNum
+            for bacteriaIndex in range(bacteriaNum):
+                ws2.cell(1, 2 + bacteriaIndex, self.bacteriaManager.bacteria[bacteriaIndex].seed)
+            for filmIndex in range(self.filmManager.filmNum):
+                ws2.cell(2 + filmIndex, 1, self.filmManager.film[filmIndex].seed)
+                for bacteriaIndex in range(bacteriaNum):
+                    ws2.cell(2 + filmIndex, 2 + bacteriaIndex,
+                             ws1.cell(2 + filmIndex * bacteriaNum + bacteriaIndex, 11).value)
+
         # save the excel file into folder result
         name = "EnergyScan_Type_{}_trail_{}-{}-{}_count.xlsx".format(str(self.simulationType), self.trail, date, time)
         file_path = "Result/ResultEnergy/" + name
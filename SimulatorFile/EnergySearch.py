@@ -0,0 +1,174 @@
+"""
+This program:
+- Searches the minimum energy position without calculating the energy at every position
+- Coarse to fine search on a downsampled film pyramid
+"""
+from typing import Tuple
+
+import numpy as np
+from numpy import ndarray
+
+from SimulatorFile.EnergyEngine import ENERGY_DECIMALS, fftEnergyMap, minimumEnergy
+from SimulatorFile.SurfaceCache import cachedArray
+
+# number of candidate positions kept at each level of the pyramid search
+PYRAMID_CANDIDATE = 64
+
+# extra positions searched around each candidate when go to the finer level
+PYRAMID_MARGIN = 2
+
+# the smallest bacteria size allowed at the coarsest level of the pyramid
+PYRAMID_MIN_KERNEL = 8
+
+# number of pyramid searches compared with the exhaustive search, and the number of them find the same minimum
+# counted for one simulation, cleared by resetPyramidAgreement when it starts
+PYRAMID_AGREEMENT = [0, 0]
+
+
+def pyramidLevel(kernelShape: Tuple[int, int]) -> int:
+    """
+    This function return how many times the film and bacteria can be downsampled
+    Stop before the bacteria at the coarsest level smaller than PYRAMID_MIN_KERNEL
+    """
+    level = 0
+    while min(kernelShape) // 2 ** (level + 1) >= PYRAMID_MIN_KERNEL:
+        level += 1
+
+    return level
+
+
+def downsample(surface: ndarray) -> ndarray:
+    """
+    This function sum every 2x2 block of the surface into one point, pad zero if the size is odd
+    """
+    height = surface.shape[0] + surface.shape[0] % 2
+    width = surface.shape[1] + surface.shape[1] % 2
+
+    padded = np.zeros((height, width))
+    padded[:surface.shape[0], :surface.shape[1]] = surface
+
+    return np.reshape(padded, (height // 2, 2, width // 2, 2)).sum(axis=(1, 3))
+
+
+def windowEnergy(film: ndarray, kernel: ndarray, positionX: ndarray, positionY: ndarray) -> ndarray:
+    """
+    This function calculate the energy of the windows start at given positions with np.dot
+    Same calculation as _calculateEnergy
+    """
+    kernel_1D = np.reshape(kernel, (-1,))
+    height, width = kernel.shape
+
+    return np.array([np.dot(np.reshape(film[x: x + height, y: y + width], (-1,)), kernel_1D)
+                     for x, y in zip(positionX, positionY)])
+
+
+def pyramidSearch(film: ndarray, kernel: ndarray, rangeX: ndarray, rangeY: ndarray,
+                  candidate: int = PYRAMID_CANDIDATE, level: int = None) -> Tuple[ndarray, ndarray, ndarray, int]:
+    """
+    This function search the minimum energy position on a film pyramid, rangeX and rangeY need to be valid positions
+    Scan every position at the coarsest level, keep the best candidates and refine them level by level,
+    at full resolution only the scan positions near the candidates are calculated exactly
+    Return energy, x and y of all positions calculated at full resolution, and the number of positions evaluated
+    """
+    if level is None:
+        level = pyramidLevel(kernel.shape)
+
+    # no pyramid can be built, calculate all positions
+    if level == 0 or len(rangeX) == 0 or len(rangeY) == 0:
+        positionX = np.repeat(rangeX, len(rangeY))
+        positionY = np.tile(rangeY, len(rangeX))
+        return windowEnergy(film, kernel, positionX, positionY), positionX, positionY, len(positionX)
+
+    # build the pyramid, index is the level, film levels can be read from cache
+    films = [film]
+    kernels = [kernel]
+    for currLevel in range(1, level + 1):
+        films.append(cachedArray("pyramid", film, (currLevel,), lambda: downsample(films[-1])))
+        kernels.append(downsample(kernels[-1]))
+
+    # scan every position at the coarsest level
+    coarse = fftEnergyMap(films[level], kernels[level])
+    evaluation = coarse.size
+    best = _lowest(np.reshape(coarse, (-1,)), candidate)
+    candidateX, candidateY = np.unravel_index(best, coarse.shape)
+
+    # refine the candidates until level 1
+    for currLevel in range(level - 1, 0, -1):
+        mapShape = (films[currLevel].shape[0] - kernels[currLevel].shape[0] + 1,
+                    films[currLevel].shape[1] - kernels[currLevel].shape[1] + 1)
+        positionX, positionY = _refine(candidateX, candidateY, np.arange(mapShape[0]), np.arange(mapShape[1]),
+                                       PYRAMID_MARGIN, PYRAMID_MARGIN)
+
+        energy = windowEnergy(films[currLevel], kernels[currLevel], positionX, positionY)
+        evaluation += len(energy)
+
+        best = _lowest(energy, candidate)
+        candidateX, candidateY = positionX[best], positionY[best]
+
+    # at full resolution, only use the scan positions, search at least one interval around candidate
+    marginX = max(PYRAMID_MARGIN, int(np.max(np.diff(rangeX), initial=0)))
+    marginY = max(PYRAMID_MARGIN, int(np.max(np.diff(rangeY), initial=0)))
+    positionX, positionY = _refine(candidateX, candidateY, rangeX, rangeY, marginX, marginY)
+
+    energy = windowEnergy(film, kernel, positionX, positionY)
+    evaluation += len(energy)
+
+    return energy, positionX, positionY, evaluation
+
+
+def resetPyramidAgreement() -> None:
+    """
+    This function clear the count of PYRAMID_AGREEMENT, so the agreement only counts the scans of one simulation
+    """
+    PYRAMID_AGREEMENT[0] = 0
+    PYRAMID_AGREEMENT[1] = 0
+
+
+def checkPyramid(film: ndarray, kernel: ndarray, rangeX: ndarray, rangeY: ndarray, charge: ndarray,
+                 energy: ndarray) -> bool:
+    """
+    This function compare the minimum of the energy calculated by pyramid search with the exhaustive search by FFT
+    The result is counted into PYRAMID_AGREEMENT, return the pyramid search find the same minimum energy or not
+    """
+    exhaustive = minimumEnergy(fftEnergyMap(film, kernel), charge, rangeX, rangeY)
+    pyramid = np.min(np.round(energy, ENERGY_DECIMALS), initial=float("INF"))
+
+    agree = bool(pyramid == exhaustive[0])
+    PYRAMID_AGREEMENT[0] += 1
+    PYRAMID_AGREEMENT[1] += int(agree)
+
+    return agree
+
+
+def _lowest(energy: ndarray, number: int) -> ndarray:
+    """
+    This helper function return the index of the lowest number of energy, in the order of energy
+    """
+    if len(energy) <= number:
+        return np.argsort(energy, kind="stable")
+
+    index = np.argpartition(energy, number - 1)[:number]
+
+    return index[np.argsort(energy[index], kind="stable")]
+
+
+def _refine(candidateX: ndarray, candidateY: ndarray, rangeX: ndarray, rangeY: ndarray, marginX: int, marginY: int) \
+        -> Tuple[ndarray, ndarray]:
+    """
+    This helper function take in candidates on the coarser level, return all positions of the finer level
+    in rangeX and rangeY around these candidates, every candidate cover two positions at the finer level
+    """
+    positions = set()
+    for x, y in zip(candidateX, candidateY):
+        # range on the finer level
+        nearX = rangeX[(rangeX >= 2 * x - marginX) & (rangeX <= 2 * x + 1 + marginX)]
+        nearY = rangeY[(rangeY >= 2 * y - marginY) & (rangeY <= 2 * y + 1 + marginY)]
+
+        for near_x in nearX:
+            for near_y in nearY:
+                positions.add((int(near_x), int(near_y)))
+
+    # sort the positions, smaller x then smaller y
+    positions = sorted(positions)
+
+    return np.array([p[0] for p in positions], dtype=np.int64), np.array([p[1] for p in positions], dtype=np.int64)
@@ -0,0 +1,165 @@
+"""
+This program:
+- Predicts the time and memory of each energy engine for a scan from a cost model
+- Keeps the constants of the model, calibrated by timing every engine on small samples of this machine
+- Chooses the engine with the smallest predicted time whose memory fits
+"""
+import os
+from typing import Tuple, List, Dict
+
+import numpy as np
+from numpy import ndarray
+
+from SimulatorFile.EnergyEngine import PACKED_BLOCK_MEMORY, fftShape
+
+# engines the AUTO engine chooses from, every one of them finds the exact minimum
+AUTO_ENGINE = ("FFT", "DIRECT", "SLIDING", "WINDOW", "PACKED", "SPARSE", "SPARSE_FILM")
+
+# engines run in the worker pool, their time is divided by the number of workers
+POOL_ENGINE = ("DIRECT", "SLIDING", "WINDOW", "PACKED", "SPARSE", "SPARSE_FILM")
+
+# samples timed to calibrate the constants, (film size, bacteria size, interval)
+CALIBRATE_SAMPLE = ((128, 8, 1), (192, 24, 2), (256, 40, 3), (384, 16, 12))
+
+# fraction of the available memory an engine can use
+MEMORY_FRACTION = 0.5
+
+# side of the grid used to estimate the domain points of film, only one point in each cell is read
+FILM_SAMPLE_STEP = 8
+
+# seconds used by one unit of each feature of the engine, key is the engine, calibrated once for each process
+COST_CONSTANT: Dict[str, ndarray] = {}
+
+# the scan to predict, (film shape, kernel shape, x and y positions, number of domain points of kernel,
+# number of kernel values, fraction of film points differ from the surface charge of film)
+ScanWorkload = Tuple[Tuple[int, int], Tuple[int, int], ndarray, ndarray, int, int, float]
+
+
+def scanFeature(engine: str, workload: ScanWorkload) -> ndarray:
+    """
+    This function return the features of the time used by engine, time is about the dot of the features and
+    the constants of engine, features are the main work, the work for each position and the work for each film point
+    """
+    filmShape, kernelShape, rangeX, rangeY, kernelCell, kernelValue, filmDensity = workload
+    height, width = kernelShape
+    position = len(rangeX) * len(rangeY)
+    area = filmShape[0] * filmShape[1]
+    if position == 0:
+        return np.zeros(3)
+
+    if engine == "FFT":
+        # the whole film is transformed whatever the interval is, the work on the energy map is about the same
+        # size as the transform, so only one feature
+        transform = np.prod(fftShape(filmShape))
+        return np.array([transform * np.log2(transform), 0, 0], dtype=np.float64)
+    elif engine == "DIRECT":
+        return np.array([position * height * width, position, area], dtype=np.float64)
+    elif engine == "SLIDING":
+        # every row of windows calculate the column correlations of bacteria on its span of film
+        span = rangeY[-1] - rangeY[0] + width
+        return np.array([len(rangeX) * height * width * span, position * width, area], dtype=np.float64)
+    elif engine == "WINDOW":
+        return np.array([position * height * width, position, area], dtype=np.float64)
+    elif engine == "PACKED":
+        wordNumber = (width + 63) // 64 + 1
+        return np.array([position * height * kernelValue * wordNumber, position, area], dtype=np.float64)
+    elif engine == "SPARSE":
+        return np.array([position * kernelCell, position, area], dtype=np.float64)
+    elif engine == "SPARSE_FILM":
+        # each domain point is under the windows of the same remainder on the intervals
+        step = _positionStep(rangeX) * _positionStep(rangeY)
+        return np.array([filmDensity * area * height * width / step, position, area], dtype=np.float64)
+    else:
+        raise RuntimeError("No cost model of energy engine: {}".format(engine))
+
+
+def scanMemory(engine: str, workload: ScanWorkload, workerNum: int) -> float:
+    """
+    This function return the bytes about used by engine for the scan
+    """
+    filmShape, kernelShape, rangeX, rangeY, _, _, filmDensity = workload
+    filmBytes = filmShape[0] * filmShape[1] * np.dtype(np.float64).itemsize
+
+    if engine == "FFT":
+        # spectrum and energy map of the transform shape, integral images and charge map of the film
+        return 2.0 * np.prod(fftShape(filmShape)) * np.dtype(np.float64).itemsize + 3 * filmBytes
+    elif engine == "DIRECT":
+        return filmBytes
+    elif engine == "SLIDING":
+        return filmBytes + workerNum * kernelShape[1] * filmShape[1] * np.dtype(np.float64).itemsize
+    elif engine == "WINDOW":
+        # windows are views, only the energy of a part and its charge map
+        return filmBytes + 2 * len(rangeX) * len(rangeY) * np.dtype(np.float64).itemsize
+    elif engine == "PACKED":
+        # bit planes of film, and the words gathered for the windows of a block in every worker
+        wordBytes = len(rangeX) * len(rangeY) * ((kernelShape[1] + 63) // 64 + 1) * np.dtype(np.uint64).itemsize
+        return filmBytes + filmBytes / 32 + min(workerNum * PACKED_BLOCK_MEMORY, wordBytes)
+    elif engine == "SPARSE":
+        # integral image of film in every part
+        return 2 * filmBytes
+    elif engine == "SPARSE_FILM":
+        # x, y and value of every domain point
+        return filmBytes + 3 * filmDensity * filmBytes
+    else:
+        raise RuntimeError("No cost model of energy engine: {}".format(engine))
+
+
+def fitConstant(featureList: List[ndarray], timeList: List[float]) -> ndarray:
+    """
+    This function fit the constants of one engine from the features and the time used of the samples
+    Constants are not negative, a negative one from the noise of timing is set to 0
+    """
+    constant = np.linalg.lstsq(np.array(featureList), np.array(timeList), rcond=None)[0]
+
+    return np.maximum(constant, 0)
+
+
+def selectEngine(candidate: List[str], workload: ScanWorkload, workerNum: int, memoryLimit: float) \
+        -> Tuple[str, float, float, Dict[str, Tuple[float, float]]]:
+    """
+    This function predict every candidate engine and return the fastest one whose memory is under memoryLimit
+    If no engine fits, the one use the least memory is taken
+    Return the engine, its predicted seconds and bytes, and the prediction of all candidates
+    """
+    prediction = {}
+    for engine in candidate:
+        seconds = float(np.dot(scanFeature(engine, workload), COST_CONSTANT[engine]))
+        if engine in POOL_ENGINE:
+            seconds /= workerNum
+        prediction[engine] = (seconds, float(scanMemory(engine, workload, workerNum)))
+
+    fit = [engine for engine in candidate if prediction[engine][1] <= memoryLimit]
+    if len(fit) > 0:
+        best = min(fit, key=lambda engine: prediction[engine][0])
+    else:
+        best = min(candidate, key=lambda engine: prediction[engine][1])
+
+    return best, prediction[best][0], prediction[best][1], prediction
+
+
+def availableMemory() -> float:
+    """
+    This function return the bytes can be used by the scan, a fraction of the memory available now
+    If the system does not tell, there is no limit
+    """
+    try:
+        return MEMORY_FRACTION * os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return float("INF")
+
+
+def filmDomainDensity(film: ndarray) -> float:
+    """
+    This function estimate the fraction of film points differ from the most common value on a grid of the film
+    """
+    sample = film[::FILM_SAMPLE_STEP, ::FILM_SAMPLE_STEP]
+    _, counts = np.unique(sample, return_counts=True)
+
+    return 1 - np.max(counts) / sample.size
+
+
+def _positionStep(positions: ndarray) -> int:
+    """
+    This function return the interval of positions, positions of a scan have the same interval
+    """
+    return int(positions[1] - positions[0]) if len(positions) > 1 else 1
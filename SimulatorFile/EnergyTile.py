@@ -0,0 +1,94 @@
+"""
+This program:
+- Splits the scan of a film larger than memory into tiles
+- Reads each tile with a bacteria sized halo from a memory mapped film file and scans it by FFT
+"""
+from typing import Tuple, List, Union
+
+import numpy as np
+from numpy import ndarray
+
+from SimulatorFile.EnergyEngine import fftEnergyMap, chargeMap, minimumEnergy, scanTrace, lowestPosition
+
+# number of scan positions on each side of one tile, memory used by one tile is about 50 times tileSize ** 2 bytes
+TILE_SIZE = 2048
+
+
+def openFilm(filmPath: str) -> ndarray:
+    """
+    This function open the film saved by np.save as a read only memory map, nothing is read until it is sliced
+    The file can be a 2D film or a 3D film with one z layer
+    """
+    film = np.load(filmPath, mmap_mode="r")
+
+    if film.ndim == 3 and film.shape[0] == 1:
+        film = film[0]
+    elif film.ndim != 2:
+        raise RuntimeError("Film in {} need to be 2D or 3D with one layer, shape is: {}".format(filmPath, film.shape))
+
+    return film
+
+
+def tileGrid(rangeX: ndarray, rangeY: ndarray, tileSize: int = TILE_SIZE) \
+        -> List[Tuple[ndarray, ndarray, Tuple[int, int]]]:
+    """
+    This function split the scan positions into tiles, positions in one tile are less than tileSize away
+    Return a list of (positions x, positions y, index of the first position in rangeX and rangeY) of each tile
+    """
+    if len(rangeX) == 0 or len(rangeY) == 0:
+        return []
+
+    # positions in the same block of tileSize go to the same tile
+    groupX = np.split(np.arange(len(rangeX)), np.flatnonzero(np.diff(rangeX // tileSize)) + 1)
+    groupY = np.split(np.arange(len(rangeY)), np.flatnonzero(np.diff(rangeY // tileSize)) + 1)
+
+    return [(rangeX[x], rangeY[y], (int(x[0]), int(y[0]))) for x in groupX for y in groupY]
+
+
+def tileEnergy(film: ndarray, kernel: ndarray, tileX: ndarray, tileY: ndarray, keepNumber: int = 0,
+               recordTrace: bool = False) \
+        -> Tuple[Tuple[Union[float, int], int, int, Union[float, int], Union[float, int], int, int], ndarray,
+                 Union[ndarray, None], ndarray]:
+    """
+    This function read the tile and the halo of kernel size from the film, scan all positions of the tile by FFT
+    Only the tile is in memory, film can be a memory map
+    Return the result in the same format as _calculateEnergy, the energy of the positions in the tile, the trace if
+    recordTrace and the lowest keepNumber positions, all positions are on the whole film
+    """
+    x_start = tileX[0]
+    y_start = tileY[0]
+
+    # read the tile with the halo, copy into memory
+    tile = np.array(film[x_start: tileX[-1] + kernel.shape[0], y_start: tileY[-1] + kernel.shape[1]],
+                    dtype=np.float64)
+
+    energyMap = fftEnergyMap(tile, kernel)
+    charge = chargeMap(tile, kernel.shape)
+
+    # positions inside the tile
+    localX = tileX - x_start
+    localY = tileY - y_start
+
+    result = minimumEnergy(energyMap, charge, localX, localY)
+    min_x, min_y = result[1], result[2]
+
+    # recalculate the minimum energy with np.dot, remove the floating error of FFT
+    min_film = tile[min_x: min_x + kernel.shape[0], min_y: min_y + kernel.shape[1]]
+    min_energy = np.dot(np.reshape(min_film, (-1,)), np.reshape(kernel, (-1,)))
+
+    result = (min_energy, int(min_x + x_start), int(min_y + y_start), result[3], result[4],
+              int(result[5] + x_start), int(result[6] + y_start))
+
+    # move the positions from the tile to the whole film
+    trace = None
+    if recordTrace:
+        trace = scanTrace(energyMap, charge, localX, localY)
+        trace["x"] += x_start
+        trace["y"] += y_start
+
+    lowest = lowestPosition(energyMap, charge, localX, localY, keepNumber)
+    lowest["x"] += x_start
+    lowest["y"] += y_start
+
+    return result, energyMap[np.ix_(localX, localY)], trace, lowest
+
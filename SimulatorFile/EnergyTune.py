@@ -0,0 +1,70 @@
+"""
+This program:
+- Splits the scan positions into balanced chunks for the worker processes
+- Lists the partitions to time on a sample of the scan, and remembers the fastest one
+"""
+from typing import Tuple, List, Dict
+
+import numpy as np
+from numpy import ndarray
+
+# fraction of the scan rows used to time each candidate partition
+TUNE_FRACTION = 0.02
+
+# number of chunks given to each process in the candidate partitions
+CHUNK_PER_PROCESS = (1, 4)
+
+# "ROW" chunk contains whole rows of y positions, "BLOCK" chunk is close to a square
+CHUNK_LAYOUT = ("ROW", "BLOCK")
+
+# partition used when not tuned, (chunk per process, layout)
+DEFAULT_PARTITION = (4, "BLOCK")
+
+# fastest partition found, key is (engine, film shape, bacteria shape, ncpus), value is (process number,
+# chunk per process, layout)
+TUNE_CACHE: Dict[Tuple, Tuple[int, int, str]] = {}
+
+
+def partitionCandidate(ncpus: int) -> List[Tuple[int, int, str]]:
+    """
+    This function return the partitions to time, (process number, chunk per process, layout)
+    numpy may use more than one cpu in np.dot, so half of the cpu is also tried
+    """
+    processNumList = sorted({ncpus, (ncpus + 1) // 2}, reverse=True)
+
+    return [(processNum, chunkPerProcess, layout) for processNum in processNumList
+            for chunkPerProcess in CHUNK_PER_PROCESS for layout in CHUNK_LAYOUT]
+
+
+def tuneSample(rangeX: ndarray, rangeY: ndarray, fraction: float = TUNE_FRACTION) -> Tuple[ndarray, ndarray]:
+    """
+    This function take the first rows of the scan positions as the sample to time the partitions
+    """
+    sampleRow = max(1, int(np.ceil(len(rangeX) * fraction)))
+
+    return rangeX[:sampleRow], rangeY
+
+
+def balancedChunk(rangeX: ndarray, rangeY: ndarray, chunkNumber: int, layout: str) \
+        -> List[Tuple[ndarray, ndarray, Tuple[int, int]]]:
+    """
+    This function split the positions into about chunkNumber chunks, number of positions in chunks differ by at most
+    one row or column, pass in only the positions inside the film so no chunk is mostly skipped
+    Return a list of (positions x, positions y, index of the first position in rangeX and rangeY) of each chunk
+    """
+    if len(rangeX) == 0 or len(rangeY) == 0:
+        return []
+
+    # number of splits on x and y
+    if layout.upper() == "ROW":
+        splitX = min(chunkNumber, len(rangeX))
+    elif layout.upper() == "BLOCK":
+        splitX = min(int(np.ceil(np.sqrt(chunkNumber))), len(rangeX))
+    else:
+        raise RuntimeError("Unknown chunk layout: {}".format(layout))
+    splitY = min(int(np.ceil(chunkNumber / splitX)), len(rangeY))
+
+    groupX = np.array_split(np.arange(len(rangeX)), splitX)
+    groupY = np.array_split(np.arange(len(rangeY)), splitY)
+
+    return [(rangeX[x], rangeY[y], (int(x[0]), int(y[0]))) for x in groupX for y in groupY]
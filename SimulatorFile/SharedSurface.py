@@ -0,0 +1,67 @@
+"""
+This program:
+- Places film and bacteria into shared memory for the energy scan worker processes
+- Lets workers attach to them by name and get a read only view without copy
+"""
+import threading
+from multiprocessing import shared_memory, resource_tracker
+from typing import Tuple
+
+import numpy as np
+from numpy import ndarray
+
+# descriptor of a shared array, (name of shared memory, shape, dtype)
+SharedDescriptor = Tuple[str, Tuple[int, ...], str]
+
+# threads of one process share and attach at the same time, the register of resource tracker is replaced when attach,
+# so only one of them can use it at a time
+_REGISTER_LOCK = threading.Lock()
+
+
+def shareArray(array: ndarray) -> Tuple[shared_memory.SharedMemory, SharedDescriptor]:
+    """
+    This function copy the array into a new shared memory block once
+    Return the shared memory, need to pass to releaseArray when done, and the descriptor to pass to workers
+    """
+    array = np.ascontiguousarray(array)
+
+    # shared memory can not have size 0
+    with _REGISTER_LOCK:
+        sharedMemory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    sharedArray = np.ndarray(array.shape, dtype=array.dtype, buffer=sharedMemory.buf)
+    sharedArray[...] = array
+
+    return sharedMemory, (sharedMemory.name, array.shape, array.dtype.str)
+
+
+def attachArray(descriptor: SharedDescriptor) -> Tuple[shared_memory.SharedMemory, ndarray]:
+    """
+    This function attach to the shared memory by name and return a read only view on it
+    The shared memory need to be closed after the view is no longer used
+    """
+    name, shape, dtype = descriptor
+    try:
+        sharedMemory = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before python 3.13, attach also register the memory to the resource tracker,
+        # which may remove the memory when the worker exit, only the creator should remove it, so skip the register
+        with _REGISTER_LOCK:
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args: None
+            try:
+                sharedMemory = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=sharedMemory.buf)
+    array.flags.writeable = False
+
+    return sharedMemory, array
+
+
+def releaseArray(sharedMemory: shared_memory.SharedMemory) -> None:
+    """
+    This function close and remove the shared memory created by shareArray
+    """
+    sharedMemory.close()
+    sharedMemory.unlink()
@@ -0,0 +1,190 @@
+"""
+This program:
+- Keeps a film of uniform surface charge with a few domains as the surface charge and a list of domain points
+- Finds the domain points inside a box by a grid of buckets over the film
+- Calculates the energy of windows only from the domain points under them
+"""
+from typing import Tuple
+
+import numpy as np
+from numpy import ndarray
+
+# side of the square buckets used to find the domain points inside a box
+SPARSE_BUCKET = 64
+
+# number of (window, domain point) pairs added in one step of the scan, limit the memory used
+SPARSE_PAIR_BLOCK = 2 ** 22
+
+# sparse film, (film shape, surface charge, x, y and value of domain points, start of each bucket in domain points)
+# domain points are sorted by bucket, points in bucket b are from bucketStart[b] to bucketStart[b + 1]
+SparseFilm = Tuple[Tuple[int, int], float, ndarray, ndarray, ndarray, ndarray]
+
+
+def sparseFilm(film: ndarray) -> SparseFilm:
+    """
+    This function change the 2D film into sparse film, the surface charge is the most common value of film
+    and every point differ from it is a domain point
+    """
+    values, counts = np.unique(film, return_counts=True)
+    background = values[np.argmax(counts)]
+    cellX, cellY = np.nonzero(film != background)
+
+    return _indexCell(film.shape, background, cellX, cellY, film[cellX, cellY])
+
+
+def filmBox(sparse: SparseFilm, xStart: int, xEnd: int, yStart: int, yEnd: int) -> SparseFilm:
+    """
+    This function return the sparse film only keep the domain points in x from xStart to xEnd and y from yStart to yEnd,
+    end not included, only the buckets overlap the box are searched
+    """
+    shape, background, cellX, cellY, value, bucketStart = sparse
+    xStart, yStart = max(xStart, 0), max(yStart, 0)
+    xEnd, yEnd = min(xEnd, shape[0]), min(yEnd, shape[1])
+    if xEnd <= xStart or yEnd <= yStart:
+        empty = np.zeros(0, dtype=np.int64)
+        return _indexCell(shape, background, empty, empty, value[:0])
+
+    # buckets on one row of the grid are next to each other in domain points, so take them in one slice
+    bucketY = _bucketNumber(shape[1])
+    index = [np.arange(bucketStart[row * bucketY + yStart // SPARSE_BUCKET],
+                       bucketStart[row * bucketY + (yEnd - 1) // SPARSE_BUCKET + 1])
+             for row in range(xStart // SPARSE_BUCKET, (xEnd - 1) // SPARSE_BUCKET + 1)]
+    index = np.concatenate(index)
+
+    # buckets on the border of box may have points outside
+    inside = (cellX[index] >= xStart) & (cellX[index] < xEnd) & (cellY[index] >= yStart) & (cellY[index] < yEnd)
+    index = index[inside]
+
+    return _indexCell(shape, background, cellX[index], cellY[index], value[index])
+
+
+def denseFilm(sparse: SparseFilm, xStart: int, xEnd: int, yStart: int, yEnd: int) -> ndarray:
+    """
+    This function return the box of film in x from xStart to xEnd and y from yStart to yEnd as a 2D array
+    """
+    shape, background, cellX, cellY, value, _ = filmBox(sparse, xStart, xEnd, yStart, yEnd)
+
+    box = np.full((xEnd - xStart, yEnd - yStart), background)
+    box[cellX - xStart, cellY - yStart] = value
+
+    return box
+
+
+def sparseFilmEnergy(sparse: SparseFilm, kernel: ndarray, rangeX: ndarray, rangeY: ndarray) -> ndarray:
+    """
+    This function calculate the energy of the windows at rangeX and rangeY on sparse film, positions need to be valid
+    The energy is the surface charge of film times the sum of kernel, plus the difference of each domain point times
+    the kernel point over it, for every window cover this domain point
+    Time used is about number of domain points times area of kernel over the intervals, not the area of film
+    Return the energy of the positions, index by the index in rangeX and rangeY
+    """
+    height, width = kernel.shape
+    background = sparse[1]
+    energy = np.full((len(rangeX), len(rangeY)), background * np.sum(kernel), dtype=np.float64)
+    if len(rangeX) == 0 or len(rangeY) == 0:
+        return energy
+
+    # only the domain points under the windows
+    _, _, cellX, cellY, value, _ = filmBox(sparse, rangeX[0], rangeX[-1] + height, rangeY[0], rangeY[-1] + width)
+    difference = value - background
+
+    # index of every x and y in rangeX and rangeY, -1 if not a position
+    indexX = _positionIndex(rangeX)
+    indexY = _positionIndex(rangeY)
+
+    # the window at (x, y) cover the domain point at (x + a, y + b), on the interval only a and b with the same
+    # remainder as the domain point can be a window, so only these kernel points are visited
+    stepX, stepY = _positionStep(rangeX), _positionStep(rangeY)
+    firstA = (cellX - rangeX[0]) % stepX
+    offsetB = stepY * np.arange((width + stepY - 1) // stepY)
+
+    flatEnergy = np.reshape(energy, (-1,))
+    blockSize = max(1, SPARSE_PAIR_BLOCK // len(offsetB))
+    for shiftA in range(0, height, stepX):
+        a = firstA + shiftA
+        x = cellX - a - rangeX[0]
+        keep = (a < height) & (x >= 0) & (x < len(indexX))
+        keep[keep] = indexX[x[keep]] >= 0
+
+        windowX = indexX[x[keep]]
+        rowA = a[keep]
+        rowY = cellY[keep]
+        rowDifference = difference[keep]
+
+        for start in range(0, len(windowX), blockSize):
+            block = slice(start, start + blockSize)
+
+            # b and y of the windows cover each domain point, in shape (domain point, b)
+            b = ((rowY[block] - rangeY[0]) % stepY)[:, np.newaxis] + offsetB
+            y = rowY[block, np.newaxis] - b - rangeY[0]
+            inside = (b < width) & (y >= 0) & (y < len(indexY))
+            windowY = np.where(inside, indexY[np.clip(y, 0, len(indexY) - 1)], -1)
+            inside &= windowY >= 0
+
+            flat = windowX[block, np.newaxis] * len(rangeY) + windowY
+            weight = rowDifference[block, np.newaxis] * kernel[rowA[block, np.newaxis], np.minimum(b, width - 1)]
+            flatEnergy += np.bincount(flat[inside], weight[inside], minlength=len(flatEnergy))
+
+    return energy
+
+
+def sparseFilmCharge(sparse: SparseFilm, kernelShape: Tuple[int, int], rangeX: ndarray, rangeY: ndarray) -> ndarray:
+    """
+    This function calculate net charge (number of +1 minus number of -1) of the windows at rangeX and rangeY
+    Return the charge of the positions, index by the index in rangeX and rangeY
+    """
+    shape, background, cellX, cellY, value, bucketStart = sparse
+
+    # every point is changed into its charge, so the energy with a kernel of ones is the charge
+    charge = (shape, _pointCharge(background), cellX, cellY, _pointCharge(value), bucketStart)
+    energy = sparseFilmEnergy(charge, np.ones(kernelShape), rangeX, rangeY)
+
+    return np.rint(energy).astype(np.int64)
+
+
+def _pointCharge(value: ndarray) -> ndarray:
+    """
+    This function return 1 for +1 points, -1 for -1 points and 0 for other points
+    """
+    return (np.asarray(value) == 1).astype(np.int64) - (np.asarray(value) == -1)
+
+
+def _positionIndex(positions: ndarray) -> ndarray:
+    """
+    This function return the index of every point from positions[0] to positions[-1] in positions, -1 if not in it
+    """
+    index = np.full(positions[-1] - positions[0] + 1, -1, dtype=np.int64)
+    index[positions - positions[0]] = np.arange(len(positions))
+
+    return index
+
+
+def _positionStep(positions: ndarray) -> int:
+    """
+    This function return the step between positions if all steps are same, otherwise return 1
+    """
+    if len(positions) > 1 and np.all(np.diff(positions) == positions[1] - positions[0]):
+        return int(positions[1] - positions[0])
+
+    return 1
+
+
+def _bucketNumber(length: int) -> int:
+    """
+    This function return the number of buckets on one side of length
+    """
+    return (length + SPARSE_BUCKET - 1) // SPARSE_BUCKET
+
+
+def _indexCell(shape: Tuple[int, int], background: float, cellX: ndarray, cellY: ndarray, value: ndarray) \
+        -> SparseFilm:
+    """
+    This function sort the domain points by bucket and build the start of each bucket
+    """
+    bucketY = _bucketNumber(shape[1])
+    bucket = (cellX // SPARSE_BUCKET) * bucketY + cellY // SPARSE_BUCKET
+    order = np.argsort(bucket, kind="stable")
+    bucketStart = np.searchsorted(bucket[order], np.arange(_bucketNumber(shape[0]) * bucketY + 1))
+
+    return tuple(shape), background, cellX[order].astype(np.int64), cellY[order].astype(np.int64), value[order], \
+        bucketStart
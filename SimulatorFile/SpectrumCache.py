@@ -0,0 +1,64 @@
+"""
+This program:
+- Keeps the spectra of films and bacteria in memory, so they are calculated once for the scans of many pairs
+- Drops the least recently used spectra when the memory used is over the limit
+"""
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple
+
+import numpy as np
+
+# memory can be used by the items kept in cache, in bytes
+SPECTRUM_CACHE_LIMIT = 2 * 1024 ** 3
+
+
+class SpectrumCache:
+    """
+    This class is a least recently used cache, each item is a tuple and its size is given by itemBytes
+    """
+    memoryLimit: int
+    memoryUsed: int
+    hit: int
+    miss: int
+    items: OrderedDict
+
+    def __init__(self, memoryLimit: int = SPECTRUM_CACHE_LIMIT) -> None:
+        """
+        Init an empty cache can keep memoryLimit bytes
+        """
+        self.memoryLimit = memoryLimit
+        self.memoryUsed = 0
+        self.hit = 0
+        self.miss = 0
+        self.items = OrderedDict()
+
+    def get(self, key: Hashable, build: Callable[[], Tuple]) -> Tuple:
+        """
+        Return the item of key, if it is not in cache, build it by build() and keep it
+        The least recently used items are dropped until the memory used is under the limit, the item just built is
+        always kept even if it is larger than the limit
+        """
+        if key in self.items:
+            self.items.move_to_end(key)
+            self.hit += 1
+            return self.items[key]
+
+        self.miss += 1
+        item = build()
+        self.items[key] = item
+        self.memoryUsed += itemBytes(item)
+
+        while self.memoryUsed > self.memoryLimit and len(self.items) > 1:
+            _, dropped = self.items.popitem(last=False)
+            self.memoryUsed -= itemBytes(dropped)
+
+        return item
+
+
+def itemBytes(item: Tuple) -> int:
+    """
+    This function return the bytes of all arrays in the item, views of arrays outside the cache are not counted
+    Arrays read by memory map from the surface cache are counted, their pages are kept in memory once read
+    """
+    return sum(value.nbytes for value in item
+               if isinstance(value, np.ndarray) and not isinstance(value.base, np.ndarray))
@@ -0,0 +1,102 @@
+"""
+This program:
+- Keeps the arrays derived from a film (spectrum, integral images, pyramid levels) in a folder on disk
+- Names each file by the hash of the film and the scan parameters, so the same film scanned again reuses them
+- Reads the files back by memory map, nothing of the film is calculated again
+"""
+import hashlib
+import os
+from typing import Callable, Tuple
+
+import numpy as np
+from numpy import ndarray
+
+from SimulatorFile.EnergyEngine import filmSpectrum, chargeIntegral, integralImage, boxSum
+
+# folder of the cache, empty means no cache is used, set by setCachePath
+CACHE_PATH = [""]
+
+
+def setCachePath(path: str) -> None:
+    """
+    This function set the folder of the cache and create it, empty path turns off the cache
+    """
+    if path != "":
+        os.makedirs(path, exist_ok=True)
+    CACHE_PATH[0] = path
+
+
+def surfaceHash(surface: ndarray) -> str:
+    """
+    This function return the hash of the bytes, shape and dtype of the surface
+    The bytes are hashed every time, a surface changed in place never gets the hash of its old content
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((surface.shape, surface.dtype.str)).encode())
+    digest.update(np.ascontiguousarray(surface).data)
+
+    return digest.hexdigest()
+
+
+def cachedArray(name: str, surface: ndarray, parameters: Tuple, build: Callable[[], ndarray],
+                surfaceKey: str = None) -> ndarray:
+    """
+    This function return the array name of the surface with the parameters, if it is in the cache folder, read it
+    by memory map, otherwise build it by build() and save it into the folder
+    surfaceKey is the surfaceHash of surface if it is already calculated for this content
+    If no cache folder is set, only return build()
+    """
+    if CACHE_PATH[0] == "":
+        return build()
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update((surfaceHash(surface) if surfaceKey is None else surfaceKey).encode())
+    digest.update(repr(tuple(parameters)).encode())
+    path = os.path.join(CACHE_PATH[0], "{}_{}.npy".format(name, digest.hexdigest()))
+
+    if os.path.exists(path):
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            # file is broken, build it again
+            pass
+
+    array = build()
+
+    # write into a temporary file first, other runs never read a file half written
+    temporary = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary, "wb") as file:
+        np.save(file, array)
+    os.replace(temporary, path)
+
+    return array
+
+
+def cachedSpectrum(film: ndarray, shape: Tuple[int, int]) -> ndarray:
+    """
+    This function return the spectrum of the film in shape, same as filmSpectrum
+    """
+    return cachedArray("spectrum", film, shape, lambda: filmSpectrum(film, shape))
+
+
+def cachedChargeIntegral(film: ndarray) -> Tuple[ndarray, ndarray]:
+    """
+    This function return the integral image of positive points and negative points on the film, same as chargeIntegral
+    """
+    if CACHE_PATH[0] == "":
+        return chargeIntegral(film)
+
+    # film is hashed once for both images
+    key = surfaceHash(film)
+
+    return cachedArray("positive", film, (), lambda: integralImage(film == 1), key), \
+        cachedArray("negative", film, (), lambda: integralImage(film == -1), key)
+
+
+def cachedChargeMap(film: ndarray, kernelShape: Tuple[int, int]) -> ndarray:
+    """
+    This function calculate net charge of every window on the film from the cached integral images, same as chargeMap
+    """
+    positive, negative = cachedChargeIntegral(film)
+
+    return boxSum(positive, kernelShape) - boxSum(negative, kernelShape)
@@ -0,0 +1,53 @@
+"""
+Benchmark of the process pool and the thread pool backend of the energy scan
+Run with: python testFile/benchmark_backend.py [film size] [bacteria size] [engine]
+The cpu number is set by SLURM_CPUS_PER_TASK for each run, use a node with at least 16 cpus
+"""
+import os
+import time
+
+import numpy as np
+
+# following import from parent folder, change path
+import sys
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from SimulatorFile.EnergyCalculator import interact
+from SimulatorFile.EnergyPool import POOL_BACKEND, startPool
+
+CPU_NUMBER = [4, 8, 16]
+
+REPEAT = 3
+
+
+def benchmark(filmSize: int, bacteriaSize: int, engine: str) -> None:
+    rng = np.random.default_rng(0)
+    film = rng.choice([-1, 0, 1], size=(1, filmSize, filmSize)).astype(float)
+    bacteria = rng.choice([-1, 0, 1], size=(1, bacteriaSize, bacteriaSize)).astype(float)
+
+    for ncpus in CPU_NUMBER:
+        os.environ["SLURM_CPUS_PER_TASK"] = str(ncpus)
+
+        for backend in POOL_BACKEND:
+            startTime = time.perf_counter()
+            pool = startPool(ncpus, film[0], backend)
+            startupTime = time.perf_counter() - startTime
+
+            # first scan is not timed, threads and processes are warmed up
+            try:
+                result = interact("DOT", 1, 1, film, bacteria, 0, 0, 2, engine, pool=pool)
+
+                startTime = time.perf_counter()
+                for _ in range(REPEAT):
+                    interact("DOT", 1, 1, film, bacteria, 0, 0, 2, engine, pool=pool)
+                scanTime = (time.perf_counter() - startTime) / REPEAT
+            finally:
+                pool.close()
+
+            print("ncpus is: {}, backend is: {}, start time is: {:.3f}s, scan time is: {:.3f}s, result is: {}".format(
+                ncpus, backend, startupTime, scanTime, result[0]))
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+              sys.argv[3] if len(sys.argv) > 3 else "SLIDING")
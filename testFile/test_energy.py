@@ -0,0 +1,492 @@
+"""
+Reference equivalence tests of the energy engines against the direct np.dot scan
+Run with: python -m pytest testFile
+"""
+import os
+
+import numpy as np
+
+# following import from parent folder, change path
+import sys
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+from ExternalIO import appendCheckpoint, loadCheckpoint
+from SimulatorFile.EnergyCalculator import _calculateEnergy, _calculateEnergyFFT, _calculateEnergyPyramid, \
+    _calculateEnergyPruned, _calculateEnergySliding, _calculateEnergyWindow, _calculateEnergyPacked, \
+    _calculateEnergySparse, _calculateEnergySparseFilm, _calculateEnergyTile, _trans3DTo1D, interact, interactMatrix, \
+    interactOrientation, _calibrateCost, _selectEngine
+from SimulatorFile.EnergyEngine import TRACE_DTYPE, layerWeight, bacteriaKernel, orientKernel, scanPosition, \
+    neighbourCount, sortPosition, separatedMinimum, mergeResult, slidingEnergy, windowViewEnergy
+from SimulatorFile.EnergyPool import BLAS_THREAD_VARIABLE, startPool
+from SimulatorFile.EnergySelect import COST_CONSTANT, selectEngine, scanMemory
+from SimulatorFile.EnergySearch import PYRAMID_AGREEMENT, pyramidSearch, resetPyramidAgreement
+from SimulatorFile.EnergyTile import tileGrid, tileEnergy
+from SimulatorFile.EnergyTune import balancedChunk
+from SimulatorFile.SparseFilm import sparseFilm
+from SimulatorFile.SpectrumCache import itemBytes
+from SimulatorFile.SurfaceCache import setCachePath
+
+
+def _randomSurface(seed: int, filmSize: int, bacteriaSize: int):
+    """
+    Generate a film and a 1D bacteria with value in {-1, 0, 1}
+    """
+    rng = np.random.default_rng(seed)
+    film = rng.choice([-1, 0, 1], size=(filmSize, filmSize)).astype(float)
+    bacteria = rng.choice([-1, 0, 1], size=(bacteriaSize, bacteriaSize)).astype(float)
+
+    return film, np.reshape(bacteria, (-1,))
+
+
+def test_fft_dot_same_as_direct():
+    for seed in range(5):
+        film, bacteria = _randomSurface(seed, 40, 7)
+        range_x = np.arange(0, 40, 3)
+        range_y = np.arange(0, 40, 2)
+
+        direct = _calculateEnergy((range_x, range_y, film, bacteria), "DOT", (7, 7))
+        fft = _calculateEnergyFFT(film, bacteria, (7, 7), range_x, range_y, "DOT")
+
+        assert direct[0] == fft[0]
+        assert np.array_equal(direct[1], fft[1])
+
+
+def test_fft_cutoff_same_as_get_cutoff_film():
+    for seed in range(5):
+        for cutoff in [1, 2, 5]:
+            film, bacteria = _randomSurface(seed, 30, 6)
+            range_x = np.arange(0, 30, 2)
+            range_y = np.arange(0, 30, 3)
+
+            direct = _calculateEnergy((range_x, range_y, film, bacteria), "CUTOFF", (6, 6), cutoff)
+            fft = _calculateEnergyFFT(film, bacteria, (6, 6), range_x, range_y, "CUTOFF", cutoff)
+
+            assert direct[0][1:] == fft[0][1:]
+            assert np.isclose(direct[0][0], fft[0][0])
+            assert np.array_equal(direct[1], fft[1])
+
+
+def test_trace_same_for_direct_and_fft():
+    film, bacteria = _randomSurface(0, 30, 5)
+    range_x = np.arange(0, 30, 4)
+    range_y = np.arange(0, 30, 3)
+
+    # trace is off by default
+    assert _calculateEnergy((range_x, range_y, film, bacteria), "DOT", (5, 5))[2] is None
+
+    direct = _calculateEnergy((range_x, range_y, film, bacteria), "DOT", (5, 5), recordTrace=True)[2]
+    fft = _calculateEnergyFFT(film, bacteria, (5, 5), range_x, range_y, "DOT", recordTrace=True)[2]
+
+    assert np.array_equal(direct[["x", "y", "charge"]], fft[["x", "y", "charge"]])
+    assert np.allclose(direct["energy"], fft["energy"])
+
+
+def test_pyramid_find_planted_minimum():
+    rng = np.random.default_rng(0)
+    range_x = np.arange(0, 200, 2)
+    range_y = np.arange(0, 200, 2)
+
+    resetPyramidAgreement()
+    for seed in range(3):
+        # film and bacteria with domains, bacteria planted with opposite charge gives the clear minimum
+        film = np.kron(rng.choice([-1, 0, 1], size=(34, 34)), np.ones((6, 6)))[:200, :200]
+        bacteria = np.kron(rng.choice([-1, 0, 1], size=(8, 8)), np.ones((4, 4)))
+        film[42: 74, 102: 134] = -bacteria
+
+        direct = _calculateEnergy((range_x, range_y, film, np.reshape(bacteria, (-1,))), "DOT", (32, 32))
+        pyramid = _calculateEnergyPyramid(film, np.reshape(bacteria, (-1,)), (32, 32), range_x, range_y, "DOT",
+                                          check=True)
+
+        assert pyramid[0][:3] == direct[0][:3] == (-np.sum(bacteria ** 2), 42, 102)
+        assert pyramid[0] == direct[0]
+
+    # every scan checked agrees with the exhaustive search
+    assert PYRAMID_AGREEMENT == [3, 3]
+
+    # the last film has the last bacteria planted, only a part of the positions are calculated
+    evaluation = pyramidSearch(film, bacteria, range_x[range_x <= 168], range_y[range_y <= 168])[3]
+    assert evaluation < len(range_x[range_x <= 168]) * len(range_y[range_y <= 168])
+
+
+def test_pruned_same_as_direct():
+    for seed in range(5):
+        film, bacteria = _randomSurface(seed, 40, 6)
+        range_x = np.arange(0, 35, 2)
+        range_y = np.arange(0, 35, 1)
+
+        direct = _calculateEnergy((range_x, range_y, film, bacteria), "DOT", (6, 6), keepNumber=5)
+        pruned = _calculateEnergyPruned((range_x, range_y, film, bacteria), "DOT", (6, 6), keepNumber=5)
+
+        assert direct[0] == pruned[0]
+        assert np.array_equal(direct[1], pruned[1])
+        assert np.array_equal(direct[3], pruned[3])
+        assert 0 <= pruned[4] < len(range_x) * len(range_y)
+
+
+def test_sliding_same_as_direct():
+    for seed in range(5):
+        film, bacteria = _randomSurface(seed, 36, 5)
+        range_x = np.arange(1, 32, 2)
+        range_y = np.arange(2, 32, 1)
+
+        direct = _calculateEnergy((range_x, range_y, film, bacteria), "DOT", (5, 5), recordTrace=True, keepNumber=3)
+        sliding = _calculateEnergySliding((range_x, range_y, film, bacteria), "DOT", (5, 5), True, 3)
+
+        assert direct[0] == sliding[0]
+        assert np.array_equal(direct[1], sliding[1])
+        assert np.array_equal(direct[2], sliding[2])
+        assert np.array_equal(direct[3], sliding[3])
+
+
+def test_window_same_as_direct():
+    rng = np.random.default_rng(4)
+    film = rng.choice([-1, 0, 1], size=(40, 40)).astype(float)
+    bacteria = rng.choice([-1, 0, 1], size=28).astype(float)
+
+    # positions with the same interval are sliced from the view, others are copied out
+    positions = [(np.arange(1, 32, 2), np.arange(2, 36, 1)), (np.array([0, 3, 4, 20]), np.arange(0, 36, 5))]
+    for range_x, range_y in positions:
+        direct = _calculateEnergy((range_x, range_y, film, bacteria), "DOT", (4, 7), recordTrace=True, keepNumber=3)
+        window = _calculateEnergyWindow((range_x, range_y, film, bacteria), "DOT", (4, 7), True, 3)
+
+        assert direct[0] == window[0]
+        assert np.array_equal(direct[1], window[1])
+        assert np.array_equal(direct[2], window[2])
+        assert np.array_equal(direct[3], window[3])
+
+    # a wide film is scanned in several blocks of rows
+    film = rng.choice([-1, 0, 1], size=(200, 2000)).astype(float)
+    kernel = rng.choice([-1, 0, 1], size=(5, 6)).astype(float)
+    range_x, range_y = np.arange(0, 195), np.arange(3, 1990, 4)
+    assert np.allclose(windowViewEnergy(film, kernel, range_x, range_y), slidingEnergy(film, kernel, range_x, range_y))
+
+
+def test_packed_same_as_direct():
+    rng = np.random.default_rng(4)
+    for _ in range(3):
+        # bacteria wider than one word, so windows cross the words of the film
+        film = rng.choice([-1, 0, 1], size=(30, 150)).astype(float)
+        bacteria = rng.choice([-1, 0, 1], size=6 * 70).astype(float)
+        range_x = np.arange(0, 25, 2)
+        range_y = np.arange(3, 81, 1)
+
+        direct = _calculateEnergy((range_x, range_y, film, bacteria), "DOT", (70, 6), recordTrace=True, keepNumber=3)
+        packed = _calculateEnergyPacked((range_x, range_y, film, bacteria), "DOT", (70, 6), True, 3)
+
+        assert direct[0] == packed[0]
+        assert np.array_equal(direct[1], packed[1])
+        assert np.array_equal(direct[2], packed[2])
+        assert np.array_equal(direct[3], packed[3])
+
+
+def test_sparse_same_as_direct():
+    rng = np.random.default_rng(5)
+    for _ in range(3):
+        film = rng.choice([-1, 0, 1], size=(40, 36)).astype(float)
+
+        # uniform surface charge with a few domain points
+        bacteria = np.full(6 * 8, -1.0)
+        bacteria[rng.choice(len(bacteria), 5, replace=False)] = 1
+        range_x = np.arange(0, 31, 1)
+        range_y = np.arange(2, 29, 3)
+
+        direct = _calculateEnergy((range_x, range_y, film, bacteria), "DOT", (8, 6), recordTrace=True, keepNumber=3)
+        sparse = _calculateEnergySparse((range_x, range_y, film, bacteria), "DOT", (8, 6), True, 3)
+
+        assert direct[0] == sparse[0]
+        assert np.array_equal(direct[1], sparse[1])
+        assert np.array_equal(direct[2], sparse[2])
+        assert np.array_equal(direct[3], sparse[3])
+
+    # the film is checked once by interact, a film not in integers is not scanned by SPARSE
+    try:
+        interact("DOT", 1, 1, film[np.newaxis] + 0.5, np.reshape(bacteria, (1, 8, 6)), 0, 0, 2, "SPARSE")
+        assert False
+    except RuntimeError as error:
+        assert "integers" in str(error)
+
+
+def test_sparse_film_same_as_direct():
+    rng = np.random.default_rng(6)
+    for _ in range(3):
+        # uniform film with a few domain points
+        film = np.full((40, 36), -1.0)
+        film[rng.random(film.shape) < 0.05] = 1
+        bacteria = rng.choice([-1, 0, 1], size=6 * 8).astype(float)
+        range_x = np.arange(0, 31, 1)
+        range_y = np.arange(2, 29, 3)
+
+        direct = _calculateEnergy((range_x, range_y, film, bacteria), "DOT", (8, 6), recordTrace=True, keepNumber=3)
+        sparse = _calculateEnergySparseFilm((range_x, range_y, sparseFilm(film), bacteria), "DOT", (8, 6), True, 3)
+
+        assert direct[0] == sparse[0]
+        assert np.array_equal(direct[1], sparse[1])
+        assert np.array_equal(direct[2], sparse[2])
+        assert np.array_equal(direct[3], sparse[3])
+
+
+def test_matrix_same_as_scan_each_pair():
+    rng = np.random.default_rng(7)
+    filmList = [rng.choice([-1, 0, 1], size=(1, 30, 34)).astype(float) for _ in range(3)]
+    bacteriaList = [rng.choice([-1, 0, 1], size=(1, 5, 8)).astype(float) for _ in range(4)]
+
+    # a small cache only keeps one bacteria, so films are prepared again for every bacteria
+    for cacheLimit in [2 * 1024 ** 3, 1]:
+        result = {(i, j): r for i, j, r in interactMatrix("DOT", 2, 3, filmList, bacteriaList, 0, 2,
+                                                          cacheLimit=cacheLimit)}
+        assert len(result) == 12
+
+        for (i, j), r in result.items():
+            film = filmList[i][0]
+            range_x, range_y = scanPosition(film.shape, (8, 5), np.arange(0, 34, 2), np.arange(0, 30, 3))
+            direct = _calculateEnergy((range_x, range_y, film, np.reshape(bacteriaList[j][0], (-1,))), "DOT",
+                                      (5, 8))[0]
+            assert r == direct
+
+
+def test_orientation_same_as_scan_each_orientation():
+    rng = np.random.default_rng(3)
+    for _ in range(3):
+        film = rng.choice([-1, 0, 1], size=(1, 40, 46)).astype(float)
+        bacteria = rng.choice([-1, 0, 1], size=(1, 5, 8)).astype(float)
+
+        result, orientation = interactOrientation("DOT", 2, 3, film, bacteria, 0, 0, 2, 8)
+
+        # scan every orientation alone, keep the first lowest
+        best = None
+        kernel = bacteriaKernel(np.reshape(bacteria[0], (-1,)), bacteria[0].shape)
+        for currOrientation in range(8):
+            oriented = orientKernel(kernel, currOrientation)
+            range_x, range_y = scanPosition(film[0].shape, oriented.shape, np.arange(0, 46, 2), np.arange(0, 40, 3))
+            direct = _calculateEnergy((range_x, range_y, film[0], np.reshape(oriented, (-1,))), "DOT",
+                                      (oriented.shape[1], oriented.shape[0]))[0]
+            if best is None or direct[0] < best[0][0]:
+                best = (direct, currOrientation)
+
+        assert orientation == best[1]
+        assert result == best[0]
+
+
+def test_thread_pool_same_as_process_pool():
+    rng = np.random.default_rng(6)
+    film = rng.choice([-1, 0, 1], size=(1, 40, 46)).astype(float)
+    bacteria = rng.choice([-1, 0, 1], size=(1, 5, 8)).astype(float)
+
+    results = []
+    environment = {variable: os.environ.get(variable) for variable in BLAS_THREAD_VARIABLE}
+    for backend in ["PROCESS", "THREAD"]:
+        pool = startPool(2, film[0], backend)
+        share = pool._shareFilm
+        shared = []
+        pool._shareFilm = lambda surface: shared.append(surface) or share(surface)
+        try:
+            # the second scan reuse the film kept in the pool, a new view of the same film is not shared again
+            for engine in ["SLIDING", "SPARSE_FILM", "SLIDING", "AUTO"]:
+                results.append(interact("DOT", 2, 3, film, bacteria, 0, 0, 2, engine, pool=pool))
+            assert len(shared) == 0
+
+            pool.setFilm(film[0].copy())
+            assert len(shared) == 1
+        finally:
+            pool.close()
+
+    assert all(result == results[0] for result in results)
+
+    # BLAS threads of this process are set back once the thread pool is closed
+    assert environment == {variable: os.environ.get(variable) for variable in BLAS_THREAD_VARIABLE}
+
+
+def test_auto_same_as_fft_and_fit_memory():
+    rng = np.random.default_rng(8)
+    film = rng.choice([-1, 0, 1], size=(1, 60, 64)).astype(float)
+    bacteria = rng.choice([-1, 0, 1], size=(1, 7, 7)).astype(float)
+
+    for interactType in ["DOT", "CUTOFF"]:
+        fft = interact(interactType, 2, 3, film, bacteria, 0, 2, 2, "FFT")
+        auto = interact(interactType, 2, 3, film, bacteria, 0, 2, 2, "AUTO")
+        assert auto == fft
+
+    # CUTOFF scanned by DIRECT is far slower than predicted, AUTO takes FFT for it even if DIRECT looks free
+    large = rng.choice([-1, 0, 1], size=(400, 400)).astype(float)
+    kernel = rng.choice([-1, 0, 1], size=30 * 30).astype(float)
+    interval = np.arange(0, 371, 10)
+    constant = COST_CONSTANT["DIRECT"]
+    COST_CONSTANT["DIRECT"] = np.zeros_like(constant)
+    try:
+        assert _selectEngine(large, kernel, (30, 30), interval, interval, "DOT") == "DIRECT"
+        assert _selectEngine(large, kernel, (30, 30), interval, interval, "CUTOFF") == "FFT"
+    finally:
+        COST_CONSTANT["DIRECT"] = constant
+
+    # engines over the memory limit are not chosen, the one use the least memory is taken if none fits
+    workload = ((2000, 2000), (50, 50), np.arange(0, 1950, 5), np.arange(0, 1950, 5), 1000, 2, 0.2)
+    engine, _, _, prediction = selectEngine(["FFT", "DIRECT", "SLIDING"], workload, 4, float("INF"))
+    assert prediction[engine][0] == min(seconds for seconds, _ in prediction.values())
+
+    engine, _, memory, _ = selectEngine(["FFT", "DIRECT", "SLIDING"], workload, 4, 0)
+    assert engine == "DIRECT" and memory == scanMemory("DIRECT", workload, 4)
+
+
+def test_separated_minimum_merged_from_parts():
+    film, bacteria = _randomSurface(3, 50, 6)
+    range_x = np.arange(0, 50, 2)
+    range_y = np.arange(0, 50, 3)
+
+    for number, separation in [(5, 0), (5, 4), (8, 7)]:
+        keep = number * neighbourCount(separation, 2, 3)
+
+        # pick one by one from all positions scanned
+        full = sortPosition(_calculateEnergy((range_x, range_y, film, bacteria), "DOT", (6, 6), recordTrace=True)[2])
+        expect = separatedMinimum([full], number, separation)
+
+        # merge the lowest positions kept by four parts
+        parts = [_calculateEnergy((range_x[i: i + 13], range_y[j: j + 9], film, bacteria), "DOT", (6, 6),
+                                  keepNumber=keep)[3] for i in [0, 13] for j in [0, 9]]
+        fft = _calculateEnergyFFT(film, bacteria, (6, 6), range_x, range_y, "DOT", keepNumber=keep)[3]
+
+        assert len(expect) == number
+        assert np.array_equal(separatedMinimum(parts, number, separation)[["x", "y"]], expect[["x", "y"]])
+        assert np.array_equal(separatedMinimum([fft], number, separation)[["x", "y"]], expect[["x", "y"]])
+
+
+def test_tile_same_as_fft(tmp_path):
+    film, bacteria = _randomSurface(4, 60, 7)
+    range_x = np.arange(0, 60, 2)
+    range_y = np.arange(0, 60, 3)
+    kernel = np.reshape(bacteria, (7, 7))
+
+    # scan the memory mapped film in small tiles, so the halo cross many tile borders
+    np.save(tmp_path / "film.npy", film)
+    film_map = np.load(tmp_path / "film.npy", mmap_mode="r")
+    tiles = tileGrid(range_x[range_x <= 53], range_y[range_y <= 53], 10)
+    tiled = mergeResult([tileEnergy(film_map, kernel, tile_x, tile_y)[0] for tile_x, tile_y, _ in tiles])
+
+    fft = _calculateEnergyFFT(film, bacteria, (7, 7), range_x, range_y, "DOT", recordTrace=True)
+
+    assert len(tiles) == 36
+    assert tiled == fft[0]
+
+    # every tile write its block of the trace file, same trace as FFT
+    trace = np.lib.format.open_memmap(tmp_path / "trace.npy", mode="w+", dtype=TRACE_DTYPE, shape=(len(fft[2]),))
+    trace.flush()
+    for tile in tiles:
+        _calculateEnergyTile(tile, str(tmp_path / "film.npy"), kernel, tracePath=str(tmp_path / "trace.npy"),
+                             scanShape=(27, 18))
+    trace = np.load(tmp_path / "trace.npy")
+
+    assert np.array_equal(trace[["x", "y", "charge"]], fft[2][["x", "y", "charge"]])
+    assert np.allclose(trace["energy"], fft[2]["energy"])
+
+
+def test_surface_cache_reused_by_second_scan(tmp_path):
+    film, bacteria = _randomSurface(9, 80, 32)
+    range_x = np.arange(0, 80, 3)
+    range_y = np.arange(0, 80, 2)
+
+    expected = [_calculateEnergyFFT(film, bacteria, (32, 32), range_x, range_y, "DOT")[0],
+                _calculateEnergyPyramid(film, bacteria, (32, 32), range_x, range_y, "DOT")[0]]
+
+    setCachePath(str(tmp_path))
+    try:
+        for _ in range(2):
+            fft = _calculateEnergyFFT(film, bacteria, (32, 32), range_x, range_y, "DOT")
+            pyramid = _calculateEnergyPyramid(film, bacteria, (32, 32), range_x, range_y, "DOT")
+            assert [fft[0], pyramid[0]] == expected
+
+        # spectrum, two integral images and two pyramid levels, saved once by the first scan
+        assert sorted(name.split("_")[0] for name in os.listdir(tmp_path)) == \
+            ["negative", "positive", "pyramid", "pyramid", "spectrum"]
+
+        # the same film in another array gives the same files
+        _calculateEnergyFFT(film.copy(), bacteria, (32, 32), range_x, range_y, "DOT")
+        assert len(os.listdir(tmp_path)) == 5
+
+        # spectrum read by memory map is counted by the spectrum cache, the view of the film is not
+        spectrum = np.load(os.path.join(tmp_path, [name for name in os.listdir(tmp_path) if "spectrum" in name][0]),
+                           mmap_mode="r")
+        assert itemBytes((film[1:], spectrum)) == spectrum.nbytes
+
+        # samples of the cost model are not saved into the cache
+        _calibrateCost()
+        assert len(os.listdir(tmp_path)) == 5
+
+        # film changed in place is a new film, not the files of its old content
+        film[: 40] = -film[: 40]
+        changed = _calculateEnergyFFT(film, bacteria, (32, 32), range_x, range_y, "DOT")
+        setCachePath("")
+        assert changed[0] == _calculateEnergyFFT(film, bacteria, (32, 32), range_x, range_y, "DOT")[0]
+        assert len(os.listdir(tmp_path)) == 8
+    finally:
+        setCachePath("")
+
+
+def test_trans_3D_to_1D_use_contact_layer():
+    rng = np.random.default_rng(6)
+
+    # same shell for every bacteria, charge changes, so the second one use the cached contact layer
+    shell = rng.random((6, 9, 8)) < 0.3
+    for _ in range(2):
+        bacteria = np.where(shell, rng.choice([-1, 0, 1], size=shell.shape), 2)
+
+        # value of the first layer not empty divided by its height
+        expect = np.zeros(shell.shape[1:])
+        for y in range(shell.shape[1]):
+            for x in range(shell.shape[2]):
+                layer = np.flatnonzero(shell[:, y, x])
+                if len(layer) > 0:
+                    expect[y, x] = bacteria[layer[0], y, x] / (layer[0] + 1)
+
+        assert np.array_equal(_trans3DTo1D(bacteria), np.reshape(expect, (-1,)))
+
+
+def test_layered_kernel_same_as_sum_of_layers():
+    rng = np.random.default_rng(0)
+    film = rng.choice([-1, 0, 1], size=(30, 30)).astype(float)
+    bacteria = rng.choice([-1, 0, 1, 2], size=(4, 5, 5))
+    range_x = np.arange(0, 26)
+    range_y = np.arange(0, 26)
+
+    for energyModel in ["COULOMB", "SCREENED"]:
+        weight = layerWeight(4, energyModel, 2.0)
+        layered = _calculateEnergy((range_x, range_y, film, _trans3DTo1D(bacteria, energyModel, 2.0)), "DOT", (5, 5),
+                                   recordTrace=True)[2]
+
+        # energy of each layer scanned alone, weighted by its distance
+        total = 0
+        for z in range(4):
+            layer = np.reshape(np.where(bacteria[z] == 2, 0, bacteria[z]), (-1,)).astype(float)
+            total = total + weight[z] * _calculateEnergy((range_x, range_y, film, layer), "DOT", (5, 5),
+                                                         recordTrace=True)[2]["energy"]
+
+        assert np.allclose(layered["energy"], total)
+
+
+def test_balanced_chunk_cover_every_position_once():
+    range_x = np.arange(0, 95, 3)
+    range_y = np.arange(0, 40, 2)
+
+    for chunkNumber in [1, 3, 8, 50]:
+        for layout in ["ROW", "BLOCK"]:
+            chunks = balancedChunk(range_x, range_y, chunkNumber, layout)
+            positions = [(x, y) for chunk_x, chunk_y, _ in chunks for x in chunk_x for y in chunk_y]
+            sizes = [len(chunk_x) * len(chunk_y) for chunk_x, chunk_y, _ in chunks]
+
+            # every position once, block index points to the first position of the chunk
+            assert sorted(positions) == [(x, y) for x in range_x for y in range_y]
+            assert all(range_x[i] == chunk_x[0] and range_y[j] == chunk_y[0] for chunk_x, chunk_y, (i, j) in chunks)
+            assert len(chunks) >= min(chunkNumber, len(range_x) * len(range_y))
+            assert max(sizes) <= 2 * min(sizes)
+
+
+def test_checkpoint_skip_line_not_complete(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    appendCheckpoint({"iter": 0, "result": [-3.0, 1, 2]}, path)
+
+    # job killed when writing the second iteration
+    with open(path, "a") as file:
+        file.write('{"iter": 1, "res')
+
+    appendCheckpoint({"iter": 1, "result": [-5.0, 0, 4]}, path)
+
+    assert [record["iter"] for record in loadCheckpoint(path)] == [0, 1]
+    assert loadCheckpoint(str(tmp_path / "missing.jsonl")) == []